@@ -0,0 +1,180 @@
+"""Benchmarks for the rcon client against the local fake server.
+
+Measures commands/sec, p50/p99 latency and allocations of `SourceRcon` at different payload sizes
+and concurrency levels, and of `RconPacket.pack` / `unpack` on their own.
+
+Run from `src/`:
+    python -m benchmarks.bench_rcon
+    python -m benchmarks.bench_rcon -payloads 16,4000 -concurrency 1,8 -commands 2000 -json results.json
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+
+from loguru import logger
+
+from benchmarks.fake_rcon_server import FakePalworldServer
+from palworld_rcon.source_rcon import RCONPacketType, RconPacket, SourceRcon
+
+
+@dataclass
+class BenchResult:
+    name: str
+    payload: int  # Response / body bytes.
+    concurrency: int
+    operations: int
+    seconds: float
+    p50_ms: float = None
+    p99_ms: float = None
+    alloc_bytes_per_op: float = None  # Peak bytes allocated per operation (tracemalloc, separate run).
+
+    @property
+    def ops_per_second(self) -> float:
+        return self.operations / self.seconds if self.seconds else 0.0
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure_allocations(func, operations: int) -> float:
+    """Average peak bytes allocated while `func` runs, including short lived garbage (tracemalloc)."""
+    total = 0
+    tracemalloc.start()
+    try:
+        for _ in range(operations):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            func()
+            total += tracemalloc.get_traced_memory()[1] - current
+    finally:
+        tracemalloc.stop()
+    return total / operations
+
+
+def bench_packets(payload: int, operations: int) -> list:
+    packet = RconPacket(
+        id=1, type=RCONPacketType.SERVERDATA_EXECCOMMAND, body="x" * payload
+    )
+    packed = packet.pack()
+    view = memoryview(packed)
+    results = []
+    for name, func in (
+        ("RconPacket.pack", packet.pack),
+        ("RconPacket.unpack", lambda: RconPacket.unpack(view)),
+    ):
+        start_time = time.perf_counter()
+        for _ in range(operations):
+            func()
+        seconds = time.perf_counter() - start_time
+        results.append(
+            BenchResult(
+                name=name,
+                payload=payload,
+                concurrency=1,
+                operations=operations,
+                seconds=seconds,
+                alloc_bytes_per_op=measure_allocations(func, min(operations, 1000)),
+            )
+        )
+    return results
+
+
+def bench_client(server: FakePalworldServer, payload: int, concurrency: int, operations: int) -> BenchResult:
+    rcon = SourceRcon(
+        "127.0.0.1", server.port, server.password, pool_max_size=concurrency
+    )
+    args = [str(payload)]
+    rcon.query("Payload", args)  # Warm up the pool.
+
+    def timed_query(_) -> float:
+        start = time.perf_counter()
+        rcon.query("Payload", args)
+        return time.perf_counter() - start
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(timed_query, range(operations)))
+    seconds = time.perf_counter() - start_time
+
+    alloc_bytes = measure_allocations(lambda: rcon.query("Payload", args), min(operations, 200))
+    rcon.close()
+    return BenchResult(
+        name="SourceRcon.query",
+        payload=payload,
+        concurrency=concurrency,
+        operations=operations,
+        seconds=seconds,
+        p50_ms=percentile(latencies, 0.50) * 1000,
+        p99_ms=percentile(latencies, 0.99) * 1000,
+        alloc_bytes_per_op=alloc_bytes,
+    )
+
+
+def format_results(results: list) -> str:
+    header = f"{'benchmark':<20} {'payload':>8} {'conc':>5} {'ops/s':>12} {'p50 ms':>9} {'p99 ms':>9} {'alloc B/op':>11}"
+    lines = [header, "-" * len(header)]
+
+    def number(value, width: int, spec: str) -> str:
+        """`value` right aligned in `width` columns, "-" (padded the same) if it wasn't measured."""
+        return format("-", f">{width}") if value is None else format(value, f">{width}{spec}")
+
+    for result in results:
+        lines.append(
+            f"{result.name:<20} {result.payload:>8} {result.concurrency:>5} "
+            f"{result.ops_per_second:>12,.0f} {number(result.p50_ms, 9, '.3f')} "
+            f"{number(result.p99_ms, 9, '.3f')} {number(result.alloc_bytes_per_op, 11, '.0f')}"
+        )
+    return "\n".join(lines)
+
+
+def get_cli_args():
+    parser = argparse.ArgumentParser(description="Benchmark the rcon client against a fake server.")
+    parser.add_argument("-payloads", default="16,1024,4000,16000", help="Comma separated response sizes in bytes.")
+    parser.add_argument("-concurrency", default="1,4,16", help="Comma separated client thread counts.")
+    parser.add_argument("-commands", type=int, default=1000, help="Commands per client benchmark.")
+    parser.add_argument("-packets", type=int, default=50000, help="Operations per packet benchmark.")
+    parser.add_argument("-latency", type=float, default=0.0, help="Fake server latency in seconds.")
+    parser.add_argument("-json", help="Also write the results to this file.")
+    return parser.parse_args()
+
+
+def main():
+    args = get_cli_args()
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    payloads = [int(payload) for payload in args.payloads.split(",")]
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+
+    results = []
+    for payload in payloads:
+        results.extend(bench_packets(payload, args.packets))
+
+    # Palworld doesn't split responses, so neither does the fake server here.
+    with FakePalworldServer(latency=args.latency, split_size=max(payloads) + 1) as server:
+        for payload in payloads:
+            for concurrency in concurrency_levels:
+                results.append(bench_client(server, payload, concurrency, args.commands))
+
+    print(format_results(results))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                [{**asdict(result), "ops_per_second": result.ops_per_second} for result in results],
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
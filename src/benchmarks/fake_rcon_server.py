@@ -0,0 +1,208 @@
+"""Local fake Palworld rcon server for benchmarks and trying things out without a game server.
+
+Implements the parts of the Source rcon protocol palworld uses:
+* Auth, answered like a Source server (an empty SERVERDATA_RESPONSE_VALUE, then the auth response).
+* `Info`, `ShowPlayers` (with `players` fake players), `Save` (takes `save_delay` seconds),
+  `Broadcast`, `KickPlayer` and `Payload <bytes>` (returns that many bytes, for payload benchmarks).
+* Responses longer than `split_size` are split over several packets, and an empty
+  SERVERDATA_RESPONSE_VALUE is mirrored back (plus the extra `\\x00\\x01\\x00\\x00` packet) so clients
+  can use the sentinel trick to reassemble them.
+* `latency` seconds are added before every response, and `drop_rate` of commands get the connection
+  closed instead of an answer.
+
+Run standalone with `python -m benchmarks.fake_rcon_server -port 25575` from `src/`.
+"""
+
+import argparse
+import random
+import socketserver
+import threading
+import time
+
+from loguru import logger
+
+from palworld_rcon.source_rcon import (
+    RCONPacketType,
+    RconError,
+    RconPacket,
+    split_packets,
+)
+
+
+SENTINEL_TRAILER = "\x00\x01\x00\x00"
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: "_Server"
+
+    def handle(self) -> None:
+        fake = self.server.fake
+        buffer = b""
+        authenticated = False
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            try:
+                packets, consumed = split_packets(memoryview(buffer))
+            except RconError as e:
+                logger.debug(f"Fake rcon server closing connection: {e}")
+                return
+            buffer = buffer[consumed:]
+
+            for packet in packets:
+                if packet.type == RCONPacketType.SERVERDATA_AUTH.value:
+                    authenticated = packet.body == fake.password
+                    self._send(RconPacket(id=packet.id, type=RCONPacketType.SERVERDATA_RESPONSE_VALUE, body=""))
+                    self._send(
+                        RconPacket(
+                            id=packet.id if authenticated else -1,
+                            type=RCONPacketType.SERVERDATA_AUTH_RESPONSE,
+                            body="",
+                        )
+                    )
+                elif not authenticated:
+                    return  # Source servers drop unauthenticated connections.
+                elif packet.type == RCONPacketType.SERVERDATA_RESPONSE_VALUE.value:
+                    # Sentinel, mirror it like a Source server does.
+                    self._send(RconPacket(id=packet.id, type=RCONPacketType.SERVERDATA_RESPONSE_VALUE, body=""))
+                    self._send(
+                        RconPacket(
+                            id=packet.id,
+                            type=RCONPacketType.SERVERDATA_RESPONSE_VALUE,
+                            body=SENTINEL_TRAILER,
+                        )
+                    )
+                else:
+                    if fake.drop_rate and random.random() < fake.drop_rate:
+                        fake.dropped += 1
+                        return
+                    if fake.latency:
+                        time.sleep(fake.latency)
+                    response = fake.respond(packet.body)
+                    # Split long responses over several packets like the game server does.
+                    for start in range(0, max(len(response), 1), fake.split_size):
+                        self._send(
+                            RconPacket(
+                                id=packet.id,
+                                type=RCONPacketType.SERVERDATA_RESPONSE_VALUE,
+                                body=response[start : start + fake.split_size],
+                            )
+                        )
+
+    def _send(self, packet: RconPacket) -> None:
+        self.request.sendall(packet.pack())
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakePalworldServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,  # 0 picks a free port, see `address`.
+        password: str = "password",
+        players: int = 0,  # Fake players returned by ShowPlayers.
+        save_delay: float = 0.0,  # Seconds `Save` takes.
+        latency: float = 0.0,  # Seconds added before every command response.
+        drop_rate: float = 0.0,  # Fraction of commands answered by closing the connection.
+        split_size: int = 4096,  # Max response body bytes per packet.
+    ) -> None:
+        self.password = password
+        self.players = players
+        self.save_delay = save_delay
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.split_size = split_size
+        self.commands = 0
+        self.dropped = 0
+        self._server = _Server((host, port), _Handler)
+        self._server.fake = self
+        self.address = self._server.server_address
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.address[1]
+
+    def respond(self, command_line: str) -> str:
+        self.commands += 1
+        command, _, args = command_line.partition(" ")
+        match command.lower():
+            case "info":
+                return "Welcome to Pal Server[v0.1.5.1] Fake Palworld Server"
+            case "showplayers":
+                rows = ["name,playeruid,steamid"]
+                rows.extend(
+                    f"Player{i},{1000000000 + i},{76561198000000000 + i}" for i in range(self.players)
+                )
+                return "\n".join(rows) + "\n"
+            case "save":
+                if self.save_delay:
+                    time.sleep(self.save_delay)
+                return "Complete Save"
+            case "broadcast":
+                return f"Broadcasted: {args.replace(chr(0x1F), ' ')}"
+            case "kickplayer":
+                return f"Kicked: {args}"
+            case "payload":
+                return "x" * int(args or 0)
+            case _:
+                return f"Unknown command: {command}"
+
+    def start(self) -> "FakePalworldServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake_rcon_server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakePalworldServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake palworld rcon server.")
+    parser.add_argument("-ip", default="127.0.0.1")
+    parser.add_argument("-port", type=int, default=25575)
+    parser.add_argument("-pwd", default="password")
+    parser.add_argument("-players", type=int, default=0)
+    parser.add_argument("-save_delay", type=float, default=0.0)
+    parser.add_argument("-latency", type=float, default=0.0)
+    parser.add_argument("-drop_rate", type=float, default=0.0)
+    parser.add_argument("-split_size", type=int, default=4096)
+    args = parser.parse_args()
+
+    server = FakePalworldServer(
+        args.ip,
+        args.port,
+        args.pwd,
+        players=args.players,
+        save_delay=args.save_delay,
+        latency=args.latency,
+        drop_rate=args.drop_rate,
+        split_size=args.split_size,
+    )
+    logger.info(f"Fake palworld rcon server listening on {server.address[0]}:{server.port}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""asyncio counterpart to `SourceRcon` for bots / dashboards running an event loop."""
+
+import asyncio
+import itertools
+import struct
+
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+from palworld_rcon.source_rcon import (
+    RCONPacketType,
+    RconAuthError,
+    RconConnectError,
+    RconError,
+    RconPacket,
+    format_command,
+)
+
+
+@dataclass
+class _PendingCommand:
+    future: asyncio.Future
+    request_id: int
+    sentinel_id: int = None  # Only set when `multi_packet_responses` is enabled.
+    parts: list = field(default_factory=list)
+
+
+class AsyncSourceRcon:
+    """Single multiplexed rcon connection with any number of commands in flight.
+
+    Every command gets its own request id and a background reader task routes response packets to
+    the waiting caller, so concurrent `send_command` calls don't wait on each other. The connection
+    is opened lazily and reopened on the next command if the server drops it.
+    """
+
+    def __init__(
+        self,
+        server_ip: str,
+        rcon_port: int,
+        rcon_password: str,
+        multi_packet_responses: bool = False,  # See `SourceRcon`.
+    ) -> None:
+        self.SERVER_IP = server_ip
+        self.RCON_PORT = rcon_port
+        self.RCON_PASSWORD = rcon_password
+
+        self.AUTH_FAILED_RESPONSE = -1
+        self.multi_packet_responses = multi_packet_responses
+
+        self._request_ids = itertools.count()
+        self._reader: asyncio.StreamReader = None
+        self._writer: asyncio.StreamWriter = None
+        self._reader_task: asyncio.Task = None
+        self._pending: dict[int, _PendingCommand] = {}
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "AsyncSourceRcon":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @property
+    def connected(self) -> bool:
+        return self._reader_task is not None and not self._reader_task.done()
+
+    def next_request_id(self) -> int:
+        """Monotonic request id, wrapped to stay a positive int32 (-1 means auth failed)."""
+        return next(self._request_ids) % 0x7FFFFFFF + 1
+
+    async def connect(self, timeout: int = 10) -> None:
+        """Connects and authenticates if not already connected. Raises `RconError` on failure."""
+        async with self._connect_lock:
+            if self.connected:
+                return
+            await self._close_transport()
+            try:
+                await asyncio.wait_for(self._open(), timeout)
+            except asyncio.TimeoutError:
+                await self._close_transport()
+                raise RconConnectError("Timed out while establishing a connection.")
+            except RconError:
+                await self._close_transport()
+                raise
+            self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def _open(self) -> None:
+        try:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.SERVER_IP, self.RCON_PORT
+            )
+        except OSError as e:
+            logger.error(f"Error while establishing a connection: {e}")
+            raise RconConnectError("Failed to establish connection.") from e
+        logger.debug("Socket connection successful.")
+
+        logger.debug("Authenticating to server rcon before sending command.")
+        auth_packet = RconPacket(
+            id=self.next_request_id(),
+            type=RCONPacketType.SERVERDATA_AUTH,
+            body=self.RCON_PASSWORD,
+        )
+        self._writer.write(auth_packet.pack())
+        await self._writer.drain()
+
+        # Source servers send an empty SERVERDATA_RESPONSE_VALUE ahead of the auth response, skip it.
+        auth_response = await self._read_packet()
+        while auth_response.type == RCONPacketType.SERVERDATA_RESPONSE_VALUE.value:
+            auth_response = await self._read_packet()
+
+        if (
+            auth_response.type != RCONPacketType.SERVERDATA_AUTH_RESPONSE.value
+            or auth_response.id == self.AUTH_FAILED_RESPONSE
+        ):
+            logger.error("rcon authentication failed.")
+            raise RconAuthError("Authentication failed. not running command.")
+        logger.debug("rcon authentication successful.")
+
+    async def _read_packet(self) -> RconPacket:
+        try:
+            size_field = await self._reader.readexactly(RconPacket.RCON_PACKET_SIZE_LENGTH)
+            (size,) = struct.unpack("<i", size_field)
+            if not RconPacket.RCON_PACKET_MIN_SIZE <= size <= RconPacket.RCON_PACKET_MAX_SIZE:
+                raise RconError(f"Invalid rcon packet size: {size}")
+            payload = await self._reader.readexactly(size)
+        except asyncio.IncompleteReadError as e:
+            raise RconError("Connection closed by server.") from e
+        return RconPacket.unpack(size_field + payload)
+
+    async def _read_loop(self) -> None:
+        """Routes response packets to the command waiting on their request id."""
+        try:
+            while True:
+                packet = await self._read_packet()
+                pending = self._pending.get(packet.id)
+                if pending is None:
+                    logger.debug(f"Dropping unexpected rcon packet with id {packet.id}.")
+                    continue
+
+                if pending.sentinel_id is None:
+                    self._finish(pending, result=packet.body)
+                elif packet.id == pending.sentinel_id:
+                    self._finish(pending, result="".join(pending.parts))
+                else:
+                    pending.parts.append(packet.body)
+        except (OSError, RconError) as e:
+            logger.debug(f"rcon reader stopped: {e}")
+            self._fail_pending(e if isinstance(e, RconError) else RconError(str(e)))
+
+    def _finish(self, pending: _PendingCommand, result: str) -> None:
+        self._forget(pending)
+        if not pending.future.done():
+            pending.future.set_result(result)
+
+    def _forget(self, pending: _PendingCommand) -> None:
+        self._pending.pop(pending.request_id, None)
+        if pending.sentinel_id is not None:
+            self._pending.pop(pending.sentinel_id, None)
+
+    def _fail_pending(self, error: RconError) -> None:
+        pending, self._pending = self._pending, {}
+        for command in pending.values():
+            if not command.future.done():
+                command.future.set_exception(error)
+
+    async def query(self, command: str, args: list = [], timeout: int = 10) -> str:
+        """Sends a command and waits up to `timeout` seconds for its response.
+
+        Raises `RconError` on failure. Cancelling the awaiting task abandons the command, a late
+        response for it is dropped.
+        """
+        await self.connect(timeout)
+
+        command = format_command(command, args)
+        logger.debug(f"Sending command: {command}")
+
+        pending = _PendingCommand(
+            future=asyncio.get_running_loop().create_future(),
+            request_id=self.next_request_id(),
+        )
+        packets = RconPacket(
+            id=pending.request_id,
+            type=RCONPacketType.SERVERDATA_EXECCOMMAND,
+            body=command,
+        ).pack()
+        if self.multi_packet_responses:
+            pending.sentinel_id = self.next_request_id()
+            packets += RconPacket(
+                id=pending.sentinel_id,
+                type=RCONPacketType.SERVERDATA_RESPONSE_VALUE,
+                body="",
+            ).pack()
+            self._pending[pending.sentinel_id] = pending
+        self._pending[pending.request_id] = pending
+
+        try:
+            async with self._write_lock:
+                self._writer.write(packets)
+                await self._writer.drain()
+            response = await asyncio.wait_for(pending.future, timeout)
+        except asyncio.TimeoutError:
+            raise RconError(f"Timed out waiting for response to: {command}")
+        except OSError as e:
+            if isinstance(e, RconError):
+                raise
+            raise RconError(f"Error while sending command: {e}") from e
+        finally:
+            self._forget(pending)
+
+        logger.debug(f"Command response: {response}")
+        return response
+
+    async def send_command(
+        self, command: str, args: list = [], timeout: int = 10
+    ) -> str:
+        """Same semantics as `SourceRcon.send_command`, failures are returned as a message."""
+        try:
+            return await self.query(command, args, timeout)
+        except RconError as e:
+            logger.error(e)
+            return str(e)
+
+    async def close(self) -> None:
+        """Closes the connection and fails any commands still in flight."""
+        async with self._connect_lock:
+            await self._close_transport()
+
+    async def _close_transport(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        self._fail_pending(RconError("Connection closed."))
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+            self._writer = None
+            self._reader = None
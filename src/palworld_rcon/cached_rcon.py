@@ -0,0 +1,132 @@
+"""Single-flight TTL cache in front of `SourceRcon` for read-only commands.
+
+Callers asking for the same read-only command at the same time share one in-flight request, and
+its response is reused for the command's TTL. Anything not listed in `ttls` (and every command in
+`NEVER_CACHE`) always goes straight to the server.
+"""
+
+import threading
+import time
+
+from dataclasses import dataclass
+
+from loguru import logger
+
+from palworld_rcon.source_rcon import RconError, SourceRcon, format_command
+
+
+DEFAULT_TTLS = {
+    "Info": 60,  # Server name / version, only changes on restart.
+    "ShowPlayers": 5,
+}
+# Commands that change server state or have side effects, these are never cached.
+NEVER_CACHE = {
+    "save",
+    "broadcast",
+    "kickplayer",
+    "banplayer",
+    "unbanplayer",
+    "shutdown",
+    "doexit",
+    "teleporttoplayer",
+    "teleporttome",
+}
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0  # Callers that waited on another caller's in-flight request.
+    uncached: int = 0  # Commands passed straight through.
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.response: str = None
+        self.error: Exception = None
+
+
+class CachedRcon:
+    """Drop-in for `SourceRcon` (same `query` / `send_command` methods) with caching.
+
+    Attributes not defined here (e.g. `pool`, `close`) are passed through to the wrapped rcon.
+    """
+
+    def __init__(self, rcon: SourceRcon, ttls: dict = None) -> None:
+        self.rcon = rcon
+        self.ttls = {}
+        for command, ttl in (DEFAULT_TTLS if ttls is None else ttls).items():
+            if command.lower() in NEVER_CACHE:
+                raise ValueError(f"{command} changes server state and can't be cached.")
+            self.ttls[command.lower()] = ttl
+        self.stats = CacheStats()
+        self._cache: dict[str, tuple] = {}  # formatted command -> (expires_at, response)
+        self._flights: dict[str, _Flight] = {}
+        self._generation = 0  # Bumped by `invalidate`, so responses already in flight aren't cached.
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        return getattr(self.rcon, name)
+
+    def invalidate(self, command: str = None) -> None:
+        """Drops cached responses for `command`, or everything (e.g. after a server restart)."""
+        with self._lock:
+            self._generation += 1
+            if command is None:
+                self._cache.clear()
+                return
+            for key in [key for key in self._cache if key.split(" ", 1)[0].lower() == command.lower()]:
+                del self._cache[key]
+
+    def query(self, command: str, args: list = [], timeout: int = 10) -> str:
+        """Like `SourceRcon.query`, served from the cache for read-only commands."""
+        ttl = self.ttls.get(command.lower())
+        if not ttl or ttl <= 0:
+            with self._lock:
+                self.stats.uncached += 1
+            return self.rcon.query(command, args, timeout)
+
+        key = format_command(command, args)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                self.stats.hits += 1
+                return cached[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+                self.stats.misses += 1
+            else:
+                self.stats.coalesced += 1
+
+        if not leader:
+            if not flight.done.wait(timeout):
+                raise RconError(f"Timed out waiting for in-flight {command}.")
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            flight.response = self.rcon.query(command, args, timeout)
+            with self._lock:
+                if generation == self._generation:
+                    self._cache[key] = (time.monotonic() + ttl, flight.response)
+            return flight.response
+        except Exception as e:
+            flight.error = e  # Shared with waiting callers but never cached.
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def send_command(self, command: str, args: list = [], timeout: int = 10) -> str:
+        try:
+            return self.query(command, args, timeout)
+        except RconError as e:
+            logger.error(e)
+            return str(e)
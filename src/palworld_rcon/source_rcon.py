@@ -1,11 +1,18 @@
 """Utility for server administration via source rcon."""
 
 import argparse
+import itertools
 import os
+import select
 import socket
 import struct
 import sys
+import threading
+import time
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from dataclasses import dataclass
 
 from loguru import logger
@@ -14,6 +21,25 @@ from loguru import logger
 from enum import Enum
 
 
+RESPONSE_SPLIT_SIZE = 4096  # Source servers send response bodies longer than this over several packets.
+
+
+class RconError(ConnectionError):
+    """Raised when an rcon command could not be completed."""
+
+
+class RconConnectError(RconError):
+    """Raised when the tcp connection to the rcon port can't be established."""
+
+
+class RconAuthError(RconError):
+    """Raised when the server rejects the rcon password."""
+
+
+class RconSendError(RconError):
+    """Raised when writing commands to an open rcon connection fails."""
+
+
 class RCONPacketType(Enum):
     SERVERDATA_AUTH = 3
     SERVERDATA_AUTH_RESPONSE = 2
@@ -31,13 +57,16 @@ class RconPacket:
     terminator: bytes = b"\x00"
     RCON_PACKET_HEADER_LENGTH: int = 12
     RCON_PACKET_TERMINATOR_LENGTH: int = 2
+    RCON_PACKET_SIZE_LENGTH: int = 4  # The size field doesn't count itself.
+    RCON_PACKET_MIN_SIZE: int = 10  # id + type + empty body + terminators.
+    RCON_PACKET_MAX_SIZE: int = 1 << 20  # Sanity limit so a corrupt size field can't eat all memory.
 
     def pack(self):
         body_encoded = (
             self.body.encode("ascii") + self.terminator
         )  # The packet body field is a null-terminated string encoded in ASCII
         self.size = (
-            len(body_encoded) + 10
+            len(body_encoded) + 9
         )  # Only value that can change is the length of the body, so do len(body) + 10.
         return (
             struct.pack("<iii", self.size, self.id, self.type.value)
@@ -47,55 +76,347 @@ class RconPacket:
 
     @staticmethod
     def unpack(packet: bytes):
+        """Unpacks one whole packet. Accepts any bytes-like object, including a `memoryview`."""
         if len(packet) < RconPacket.RCON_PACKET_HEADER_LENGTH:
             return RconPacket(size=None, id=None, type=None, body="Invalid packet")
 
-        size, request_id, type = struct.unpack(
-            "<iii", packet[: RconPacket.RCON_PACKET_HEADER_LENGTH]
+        size, request_id, type = struct.unpack_from("<iii", packet)
+        body = str(
+            packet[
+                RconPacket.RCON_PACKET_HEADER_LENGTH : -RconPacket.RCON_PACKET_TERMINATOR_LENGTH
+            ],
+            "utf-8",
+            errors="replace",
         )
-        body = packet[
-            RconPacket.RCON_PACKET_HEADER_LENGTH : -RconPacket.RCON_PACKET_TERMINATOR_LENGTH
-        ].decode("utf-8", errors="replace")
         return RconPacket(size=size, id=request_id, type=type, body=body)
 
 
+def split_packets(buffer: memoryview) -> tuple[list[RconPacket], int]:
+    """Splits `buffer` into whole packets using their length prefix.
+
+    Returns the unpacked packets and the number of bytes consumed. A trailing partial packet is
+    left alone so the caller can keep it until the rest of it arrives.
+    """
+    packets = []
+    offset = 0
+    buffer_length = len(buffer)
+    while buffer_length - offset >= RconPacket.RCON_PACKET_SIZE_LENGTH:
+        (size,) = struct.unpack_from("<i", buffer, offset)
+        if not RconPacket.RCON_PACKET_MIN_SIZE <= size <= RconPacket.RCON_PACKET_MAX_SIZE:
+            raise RconError(f"Invalid rcon packet size: {size}")
+        packet_end = offset + RconPacket.RCON_PACKET_SIZE_LENGTH + size
+        if packet_end > buffer_length:
+            break
+        packets.append(RconPacket.unpack(buffer[offset:packet_end]))
+        offset = packet_end
+    return packets, offset
+
+
+class RconPacketReader:
+    """Streaming packet reader for one socket.
+
+    Reads straight into a preallocated `bytearray` with `recv_into` and splits out whole packets by
+    their length prefix, so packets split across (or merged into) tcp reads are handled correctly.
+    The buffer only grows when a single packet doesn't fit in it.
+    """
+
+    def __init__(self, sock: socket.socket, buffer_size: int = 8192) -> None:
+        self.sock = sock
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # First unconsumed byte.
+        self._end = 0  # End of received data.
+        self._packets: deque[RconPacket] = deque()
+
+    def read_packet(self) -> RconPacket:
+        """Blocks until a whole packet is available. Raises `RconError` if the server hangs up."""
+        while not self._packets:
+            self._receive()
+        return self._packets.popleft()
+
+    def _receive(self) -> None:
+        if self._end == len(self._buffer):
+            self._make_room()
+
+        received = self.sock.recv_into(self._view[self._end :])
+        if not received:
+            raise RconError("Connection closed by server.")
+        self._end += received
+
+        packets, consumed = split_packets(self._view[self._start : self._end])
+        self._packets.extend(packets)
+        self._start += consumed
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def _make_room(self) -> None:
+        pending = self._end - self._start
+        if self._start:
+            # Move the partial packet to the front of the buffer.
+            self._buffer[:pending] = bytes(self._view[self._start : self._end])
+            self._start, self._end = 0, pending
+            return
+
+        # The buffer holds a single partial packet that's bigger than the buffer, so grow it.
+        needed = len(self._buffer) * 2
+        if pending >= RconPacket.RCON_PACKET_SIZE_LENGTH:
+            (size,) = struct.unpack_from("<i", self._buffer)
+            needed = max(needed, size + RconPacket.RCON_PACKET_SIZE_LENGTH)
+        buffer = bytearray(needed)
+        buffer[:pending] = self._view[:pending]
+        self._view.release()
+        self._buffer = buffer
+        self._view = memoryview(self._buffer)
+
+
+def format_command(command: str, args: list = []) -> str:
+    """Joins a command and its args into the string palworld expects."""
+    if command.lower() == "broadcast":
+        broadcast_msg = args[0]
+        # Replace spaces with fake spaces since palworld doesnt parse them correctly.
+        fixed_broadcast_msg = broadcast_msg.replace(" ", "\x1F")
+        return f"{command} {fixed_broadcast_msg}"
+    args = " ".join(args)
+    return f"{command} {args}"
+
+
+class RconConnection:
+    """A long-lived, authenticated rcon session. Normally handed out by `RconConnectionPool`."""
+
+    def __init__(self, rcon: "SourceRcon", timeout: int = 10) -> None:
+        self.rcon = rcon
+        self.timeout = timeout
+        self.sock: socket.socket = None
+        self.created_at: float = None
+        self.last_used: float = None
+        self.reused = False  # True once the connection has been returned to and taken from the pool.
+        self.reader: RconPacketReader = None
+
+    def open(self) -> None:
+        """Connects and authenticates. Raises `RconConnectError` / `RconAuthError` on failure."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        reader = RconPacketReader(sock)
+        try:
+            if not self.rcon.establish_connection(sock):
+                raise RconConnectError("Failed to establish connection.")
+            if not self.rcon.auth_to_rcon(sock, reader):
+                raise RconAuthError("Authentication failed. not running command.")
+        except OSError as e:
+            sock.close()
+            if isinstance(e, RconError):
+                raise
+            raise RconConnectError(f"Failed to establish connection: {e}") from e
+
+        self.sock = sock
+        self.reader = reader
+        self.created_at = self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+            self.reader = None
+
+    def is_alive(self) -> bool:
+        """Cheap health check for an idle connection.
+
+        An idle rcon socket should never be readable. If it is, the server either closed it (EOF)
+        or sent something we didn't ask for, and neither is safe to reuse.
+        """
+        if self.sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def execute(self, command: str, timeout: int = 10) -> str:
+        """Sends an already formatted command and returns the response body."""
+        return self.execute_many([command], timeout)[0]
+
+    def execute_many(self, commands: list, timeout: int = 10) -> list:
+        """Pipelines already formatted commands and returns their responses in order."""
+        self.sock.settimeout(timeout)
+        responses = self.rcon.execute_commands(self.sock, commands, self.reader)
+        self.last_used = time.monotonic()
+        return responses
+
+
+class RconConnectionPool:
+    """Thread-safe pool of authenticated rcon sessions to a single server.
+
+    Connections are health checked when taken from the pool, closed after `idle_timeout` seconds
+    without use, and at most `max_size` of them are open at once.
+    """
+
+    def __init__(
+        self, rcon: "SourceRcon", max_size: int = 4, idle_timeout: int = 300
+    ) -> None:
+        self.rcon = rcon
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+
+        self._idle: list[RconConnection] = []  # LIFO so the warmest connection is reused first.
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def acquire(self, timeout: int = 10) -> RconConnection:
+        """Returns a healthy pooled connection, opening a new one if none are idle."""
+        if not self._slots.acquire(timeout=timeout):
+            raise RconError("Timed out waiting for a free rcon connection.")
+        try:
+            self.evict_idle()
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    break
+                if conn.is_alive():
+                    conn.reused = True
+                    return conn
+                logger.debug("Discarding dead pooled rcon connection.")
+                conn.close()
+
+            logger.debug("Opening new pooled rcon connection.")
+            conn = RconConnection(self.rcon, timeout=timeout)
+            conn.open()
+            return conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: RconConnection, discard: bool = False) -> None:
+        """Returns `conn` to the pool, or closes it if `discard` is set."""
+        try:
+            if discard or conn.sock is None:
+                conn.close()
+            else:
+                with self._lock:
+                    self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout: int = 10):
+        """Context manager around acquire/release. Connections are discarded if the block raises."""
+        conn = self.acquire(timeout)
+        discard = True
+        try:
+            yield conn
+            discard = False
+        finally:
+            self.release(conn, discard=discard)
+
+    def evict_idle(self) -> None:
+        """Closes idle connections that haven't been used in `idle_timeout` seconds."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            stale = [c for c in self._idle if c.last_used < cutoff]
+            self._idle = [c for c in self._idle if c.last_used >= cutoff]
+        for conn in stale:
+            logger.debug("Closing idle pooled rcon connection.")
+            conn.close()
+
+    def close(self) -> None:
+        """Closes all idle connections. Connections currently checked out are closed on release."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
 class SourceRcon:
-    def __init__(self, server_ip: str, rcon_port: int, rcon_password: str) -> None:
+    """Source rcon client with pooled, pre-authenticated connections.
+
+    Servers split responses longer than `RESPONSE_SPLIT_SIZE` bytes (e.g. `ShowPlayers` with a few
+    hundred players) over several packets. Only the first one is read unless
+    `multi_packet_responses` is on, and a warning is logged when a response looks cut off.
+    """
+
+    def __init__(
+        self,
+        server_ip: str,
+        rcon_port: int,
+        rcon_password: str,
+        pool_max_size: int = 4,  # Max open rcon connections to this server.
+        pool_idle_timeout: int = 300,  # Close pooled connections after this many idle seconds.
+        multi_packet_responses: bool = False,  # Reassemble split responses using a sentinel packet. Server must echo SERVERDATA_RESPONSE_VALUE.
+    ) -> None:
         self.SERVER_IP = server_ip
         self.RCON_PORT = rcon_port
         self.RCON_PASSWORD = rcon_password
 
         self.AUTH_FAILED_RESPONSE = -1
+        self.multi_packet_responses = multi_packet_responses
+        self._request_ids = itertools.count()
+
+        self.pool = RconConnectionPool(
+            self, max_size=pool_max_size, idle_timeout=pool_idle_timeout
+        )
+        # Called with (command name, seconds, exception or None) after every command, e.g. for metrics.
+        self.observers = []
 
     def create_packet(
         self,
         command: str,
-        request_id: int = 1,
+        request_id: int = None,  # Next id from `next_request_id()` if not provided.
         type: RCONPacketType = RCONPacketType.SERVERDATA_EXECCOMMAND,
     ) -> RconPacket:
+        if request_id is None:
+            request_id = self.next_request_id()
         packet = RconPacket(id=request_id, type=type, body=command)
         final_packet = packet.pack()
 
         logger.debug(f"Final packet: {final_packet}")
         return final_packet
 
-    def receive_all(self, sock: socket.socket, bytes_in: int = 4096) -> bytes:
-        response = b""
-        while True:
-            try:
-                part = sock.recv(bytes_in)
-                if not part:
-                    break
-                response += part
-                if len(part) < bytes_in:
-                    break
-            except socket.error as e:
-                logger.error(f"Error receiving data: {e}")
-                break
-        return response
+    def next_request_id(self) -> int:
+        """Monotonic request id, wrapped to stay a positive int32 (-1 means auth failed)."""
+        return next(self._request_ids) % 0x7FFFFFFF + 1
 
-    def check_auth_response(self, auth_response_packet: bytes) -> bool:
-        unpacked_packet = RconPacket.unpack(auth_response_packet)
+    def receive_all(self, sock: socket.socket) -> bytes:
+        """Reads exactly one whole packet from `sock` and returns its raw bytes.
+
+        Doesn't read past the end of the packet, so it's safe to mix with later reads on the same
+        socket. Returns `b""` if the connection is closed or errors before a whole packet arrives.
+        """
+        size_field = bytearray(RconPacket.RCON_PACKET_SIZE_LENGTH)
+        try:
+            if not self._recv_exactly(sock, memoryview(size_field)):
+                return b""
+            (size,) = struct.unpack("<i", size_field)
+            if not RconPacket.RCON_PACKET_MIN_SIZE <= size <= RconPacket.RCON_PACKET_MAX_SIZE:
+                logger.error(f"Invalid rcon packet size: {size}")
+                return b""
+            packet = bytearray(RconPacket.RCON_PACKET_SIZE_LENGTH + size)
+            packet[: RconPacket.RCON_PACKET_SIZE_LENGTH] = size_field
+            view = memoryview(packet)
+            if not self._recv_exactly(sock, view[RconPacket.RCON_PACKET_SIZE_LENGTH :]):
+                return b""
+        except socket.error as e:
+            logger.error(f"Error receiving data: {e}")
+            return b""
+        return bytes(packet)
+
+    @staticmethod
+    def _recv_exactly(sock: socket.socket, view: memoryview) -> bool:
+        while view:
+            received = sock.recv_into(view)
+            if not received:
+                return False
+            view = view[received:]
+        return True
+
+    def check_auth_response(self, auth_response_packet) -> bool:
+        if isinstance(auth_response_packet, RconPacket):
+            unpacked_packet = auth_response_packet
+        else:
+            unpacked_packet = RconPacket.unpack(auth_response_packet)
 
         if (
             unpacked_packet.size is None
@@ -106,7 +427,9 @@ class SourceRcon:
 
         return unpacked_packet.id != self.AUTH_FAILED_RESPONSE
 
-    def auth_to_rcon(self, socket: socket.socket) -> bool:
+    def auth_to_rcon(
+        self, socket: socket.socket, reader: RconPacketReader = None
+    ) -> bool:
         # Create and send rcon authentication packet
         logger.debug("Authenticating to server rcon before sending command.")
         auth_packet = self.create_packet(
@@ -114,8 +437,13 @@ class SourceRcon:
         )
         socket.sendall(auth_packet)
 
-        # Get and parse rcon authentication response
-        auth_response = self.receive_all(socket)
+        # Get and parse rcon authentication response.
+        # Source servers send an empty SERVERDATA_RESPONSE_VALUE ahead of the auth response, skip it.
+        reader = reader or RconPacketReader(socket)
+        auth_response = reader.read_packet()
+        while auth_response.type == RCONPacketType.SERVERDATA_RESPONSE_VALUE.value:
+            auth_response = reader.read_packet()
+
         if self.check_auth_response(auth_response):
             logger.debug("rcon authentication successful.")
             return True
@@ -132,35 +460,270 @@ class SourceRcon:
             logger.error(f"Error while establishing a connection: {e}")
             return False
 
-    def execute_command(self, socket: socket.socket, command: str) -> str:
-        command_packet = self.create_packet(command)
-        socket.sendall(command_packet)
-
-        response = self.receive_all(socket)
-        unpacked_packet = RconPacket.unpack(response)
-        logger.debug(f"Command response: {unpacked_packet.body}")
-        return unpacked_packet.body
+    def execute_command(
+        self, socket: socket.socket, command: str, reader: RconPacketReader = None
+    ) -> str:
+        return self.execute_commands(socket, [command], reader)[0]
+
+    def execute_commands(
+        self, socket: socket.socket, commands: list, reader: RconPacketReader = None
+    ) -> list:
+        """Pipelines `commands` over one connection and returns their responses in order.
+
+        Every command gets its own request id and all packets go out in a single `sendall`. Response
+        packets are then routed back to their command by id, so the whole batch costs one round trip.
+        """
+        reader = reader or RconPacketReader(socket)
+
+        packets = []
+        responses: dict[int, list[str]] = {}  # command request id -> response parts.
+        sentinels: dict[int, int] = {}  # sentinel request id -> command request id.
+        for command in commands:
+            request_id = self.next_request_id()
+            responses[request_id] = []
+            packets.append(self.create_packet(command, request_id=request_id))
+            if self.multi_packet_responses:
+                # Follow the command with an empty SERVERDATA_RESPONSE_VALUE. The server answers in
+                # order, so once it mirrors the sentinel back every part of the response has arrived.
+                sentinel_id = self.next_request_id()
+                sentinels[sentinel_id] = request_id
+                packets.append(
+                    self.create_packet(
+                        "",
+                        request_id=sentinel_id,
+                        type=RCONPacketType.SERVERDATA_RESPONSE_VALUE,
+                    )
+                )
+        try:
+            socket.sendall(b"".join(packets))
+        except TimeoutError:  # socket.timeout, the caller decides what a slow server means.
+            raise
+        except OSError as e:
+            raise RconSendError(f"Error while sending command: {e}") from e
+
+        waiting = set(responses)
+        while waiting:
+            unpacked_packet = reader.read_packet()
+            if unpacked_packet.id in sentinels:
+                waiting.discard(sentinels.pop(unpacked_packet.id))
+            elif unpacked_packet.id in waiting:
+                responses[unpacked_packet.id].append(unpacked_packet.body)
+                if not self.multi_packet_responses:
+                    waiting.discard(unpacked_packet.id)
+                    body_size = (unpacked_packet.size or 0) - RconPacket.RCON_PACKET_MIN_SIZE
+                    if body_size >= RESPONSE_SPLIT_SIZE:
+                        command = dict(zip(responses, commands))[unpacked_packet.id]
+                        logger.warning(
+                            f"Response to {command.split(' ', 1)[0]} is {body_size} bytes and probably "
+                            "cut off, the rest was split into packets that aren't read. "
+                            "Use SourceRcon(multi_packet_responses=True) to reassemble them."
+                        )
+            else:
+                # Leftovers from an earlier command, e.g. the rest of a split response or the extra
+                # packet source servers send after mirroring a sentinel.
+                logger.debug(f"Dropping unexpected rcon packet with id {unpacked_packet.id}.")
+
+        results = ["".join(parts) for parts in responses.values()]
+        for command, response in zip(commands, results):
+            logger.debug(f"Command response ({command}): {response}")
+        return results
+
+    def format_command(self, command: str, args: list = []) -> str:
+        return format_command(command, args)
+
+    def query(self, command: str, args: list = [], timeout: int = 10) -> str:
+        """Sends a command over a pooled connection. Raises `RconError` on failure.
+
+        If a reused connection turns out to have been dropped by the server, it's replaced with a
+        freshly authenticated one and the command is sent again.
+        """
+        return self.query_commands([(command, args)], timeout)[0]
+
+    def query_commands(self, commands: list, timeout: int = 10) -> list:
+        """Pipelines several commands over one pooled connection in a single round trip.
+
+        `commands` items are either a command string or a `(command, args)` tuple. Returns the
+        responses in the same order. Raises `RconError` on failure.
+        """
+        commands = [
+            format_command(command) if isinstance(command, str) else format_command(*command)
+            for command in commands
+        ]
+        logger.debug(f"Sending commands: {commands}")
+
+        start_time = time.perf_counter()
+        error = None
+        try:
+            return self._query_formatted(commands, timeout)
+        except RconError as e:
+            error = e
+            raise
+        finally:
+            if self.observers:
+                seconds = time.perf_counter() - start_time
+                for command in commands:
+                    for observer in self.observers:
+                        observer(command.split(" ", 1)[0], seconds, error)
+
+    def _query_formatted(self, commands: list, timeout: int) -> list:
+        while True:
+            conn = self.pool.acquire(timeout)
+            discard = True  # A half finished exchange leaves the socket in an unknown state.
+            try:
+                responses = conn.execute_many(commands, timeout)
+                discard = False
+                return responses
+            except RconSendError as e:
+                # Only a failed send on a stale pooled socket is safe to retry, the commands never
+                # arrived. Once they're out, a lost response doesn't tell us whether they ran.
+                if conn.reused:
+                    logger.debug(f"Pooled rcon connection dropped ({e}), reconnecting.")
+                    continue
+                raise
+            except RconError:
+                raise
+            except OSError as e:
+                raise RconError(f"Error while sending command: {e}") from e
+            finally:
+                self.pool.release(conn, discard=discard)
 
     def send_command(self, command: str, args: list = [], timeout: int = 10) -> str:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.settimeout(timeout)
-            if not self.establish_connection(s):
-                return "Failed to establish connection."
-
-            if not self.auth_to_rcon(s):
-                return "Authentication failed. not running command."
-
-            if command.lower() == "broadcast":
-                broadcast_msg = args[0]
-                # Replace spaces with fake spaces since palworld doesnt parse them correctly.
-                fixed_broadcast_msg = broadcast_msg.replace(" ", "\x1F")
-                command = f"{command} {fixed_broadcast_msg}"
-            else:
-                args = " ".join(args)
-                command = f"{command} {args}"
+        try:
+            return self.query(command, args, timeout)
+        except RconError as e:
+            logger.error(e)
+            return str(e)
+
+    def send_commands(self, commands: list, timeout: int = 10) -> list:
+        """Batch version of `send_command`. See `query_commands` for the `commands` format."""
+        try:
+            return self.query_commands(commands, timeout)
+        except RconError as e:
+            logger.error(e)
+            return [str(e)] * len(commands)
+
+    def close(self) -> None:
+        """Closes pooled connections."""
+        self.pool.close()
+
+
+@dataclass
+class RconServer:
+    server_ip: str
+    rcon_port: int
+    rcon_password: str = None
+    name: str = None  # Defaults to "server_ip:rcon_port".
+
+    def __post_init__(self):
+        self.rcon_port = int(self.rcon_port)
+        if self.name is None:
+            self.name = f"{self.server_ip}:{self.rcon_port}"
+
+    @staticmethod
+    def parse(spec: str, default_password: str = None) -> "RconServer":
+        """Parses `[name=]ip:port[:password]`. The password may itself contain colons."""
+        name = None
+        if "=" in spec.split(":", 1)[0]:
+            name, spec = spec.split("=", 1)
+        parts = spec.split(":", 2)
+        if len(parts) < 2:
+            raise ValueError(f"Invalid server spec, expected ip:port[:password]: {spec}")
+        password = parts[2] if len(parts) == 3 else default_password
+        return RconServer(parts[0], parts[1], password, name=name)
+
+
+def load_servers(path: str, default_password: str = None) -> list:
+    """Reads one `[name=]ip:port[:password]` server spec per line. Blank lines and # comments are skipped."""
+    servers = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                servers.append(RconServer.parse(line, default_password))
+    return servers
+
+
+@dataclass
+class FleetResult:
+    server: RconServer
+    command: str
+    response: str = None
+    error: str = None
+    latency: float = 0.0  # Seconds from submit to response, including connect + auth if needed.
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class RconFleet:
+    """Runs rcon commands against many servers concurrently.
+
+    Each server gets its own pooled `SourceRcon`, and commands fan out over a bounded thread pool, so
+    a sweep takes as long as the slowest server instead of the sum of all of them. Results are
+    yielded as each server finishes.
+    """
+
+    def __init__(self, servers: list, max_workers: int = 16, timeout: int = 10) -> None:
+        self.servers = {server.name: server for server in servers}
+        self.timeout = timeout
+        self.clients = {
+            server.name: SourceRcon(
+                server.server_ip, server.rcon_port, server.rcon_password
+            )
+            for server in servers
+        }
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="rcon_fleet"
+        )
+
+    def __enter__(self) -> "RconFleet":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def send_command(
+        self,
+        command: str = None,
+        args: list = [],
+        per_server_commands: dict = None,  # {server name: (command, args)}, overrides `command` for that server.
+        timeout: int = None,
+    ):
+        """Sends a command to every server and yields a `FleetResult` per server as they finish."""
+        per_server_commands = per_server_commands or {}
+        timeout = timeout or self.timeout
+
+        futures = []
+        for name, server in self.servers.items():
+            server_command, server_args = per_server_commands.get(name, (command, args))
+            if server_command is None:
+                continue
+            futures.append(
+                self._executor.submit(
+                    self._run, server, server_command, server_args, timeout
+                )
+            )
+
+        for future in as_completed(futures):
+            yield future.result()
+
+    def _run(
+        self, server: RconServer, command: str, args: list, timeout: int
+    ) -> FleetResult:
+        result = FleetResult(server=server, command=command)
+        start_time = time.perf_counter()
+        try:
+            result.response = self.clients[server.name].query(command, args, timeout)
+        except RconError as e:
+            result.error = str(e)
+        result.latency = time.perf_counter() - start_time
+        return result
 
-            logger.debug(f"Sending command: {command}")
-            return self.execute_command(s, command)
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for client in self.clients.values():
+            client.close()
 
 
 def get_cli_args():
@@ -176,7 +739,6 @@ def get_cli_args():
         "--server_ip",
         type=str,
         default=default_ip,
-        required=not default_ip,
         help="IP address of the RCON server",
     )
     parser.add_argument(
@@ -184,7 +746,6 @@ def get_cli_args():
         "--rcon_port",
         type=int,
         default=default_port,
-        required=not default_port,
         help="Port of the RCON server",
     )
     parser.add_argument(
@@ -192,8 +753,30 @@ def get_cli_args():
         "--rcon_password",
         type=str,
         default=default_password,
-        required=not default_password,
-        help="RCON password",
+        help="RCON password (default for fleet servers without one)",
+    )
+    parser.add_argument(
+        "-servers",
+        "--servers",
+        nargs="*",
+        default=[],
+        help="Fleet mode: servers as [name=]ip:port[:password]",
+    )
+    parser.add_argument(
+        "-servers_file",
+        "--servers_file",
+        type=str,
+        help="Fleet mode: file with one [name=]ip:port[:password] per line",
+    )
+    parser.add_argument(
+        "-workers",
+        "--workers",
+        type=int,
+        default=16,
+        help="Fleet mode: max servers to talk to at once",
+    )
+    parser.add_argument(
+        "-timeout", "--timeout", type=int, default=10, help="Per server timeout in seconds."
     )
     parser.add_argument(
         "-cmd", "--command", required=True, help="RCON command to execute"
@@ -210,9 +793,33 @@ def get_cli_args():
     )
 
     args = parser.parse_args()
+
+    # ip / port / password are only required when not running in fleet mode.
+    if not (args.servers or args.servers_file):
+        for arg_name in ("server_ip", "rcon_port", "rcon_password"):
+            if getattr(args, arg_name) is None:
+                parser.error(f"--{arg_name} is required")
     return args
 
 
+def run_fleet(args) -> bool:
+    """Runs `args.command` on every fleet server, printing results as they arrive."""
+    servers = [RconServer.parse(spec, args.rcon_password) for spec in args.servers]
+    if args.servers_file:
+        servers += load_servers(args.servers_file, args.rcon_password)
+
+    all_ok = True
+    with RconFleet(servers, max_workers=args.workers, timeout=args.timeout) as fleet:
+        for result in fleet.send_command(args.command, args.arguments):
+            latency_ms = result.latency * 1000
+            if result.ok:
+                print(f"[{result.server.name}] ok ({latency_ms:.0f} ms): {result.response}")
+            else:
+                all_ok = False
+                print(f"[{result.server.name}] error ({latency_ms:.0f} ms): {result.error}")
+    return all_ok
+
+
 def main():
     args = get_cli_args()
 
@@ -220,8 +827,11 @@ def main():
     logger.remove()
     logger.add(sys.stderr, level=args.log_level)
 
+    if args.servers or args.servers_file:
+        sys.exit(0 if run_fleet(args) else 1)
+
     rcon = SourceRcon(args.server_ip, args.rcon_port, args.rcon_password)
-    response = rcon.send_command(args.command, args.arguments)
+    response = rcon.send_command(args.command, args.arguments, timeout=args.timeout)
     print(response)
 
 
@@ -1,12 +1,16 @@
 """Handles server uptime with auto restart, auto backup, etc."""
 
+from utility.log_follower import LogFollower
+from utility.maintenance import MaintenancePolicy
 from utility.palworld_util import PalworldUtil
-from utility.util import check_for_process
+from utility.scheduler import Scheduler
 
 import os
 import sys
+import threading
 import time
 
+from dataclasses import dataclass
 from pathlib import Path
 
 from loguru import logger
@@ -19,6 +23,13 @@ AUTOMATIC_RESTART_EVERY_X_MINUTES = 720  # -1 if you don't want to restart on a
 BACKUP_ON_RESTART = False  # Save a backup when the server restarts.
 BACKUP_EVERY_X_MINUTES = 240  # -1 if you don't want to backup on a timer.
 ROTATE_AFTER_X_BACKUPS = 20  # -1 if you don't want to rotate backups.
+BACKUP_KEEP_HOURLY = 0  # Also keep the newest backup of each of the last x hours.
+BACKUP_KEEP_DAILY = 0  # Also keep the newest backup of each of the last x days.
+BACKUP_KEEP_WEEKLY = 0  # Also keep the newest backup of each of the last x weeks.
+BACKUP_MODE = "copy"  # "incremental" to deduplicate unchanged files between backups (cheap enough for frequent backups), "archive" for compressed archives.
+ARCHIVE_CODEC = "gzip"  # Only used if BACKUP_MODE = "archive". "gzip", "bz2", "xz" or "zstd" (pip install zstandard).
+BACKUP_IO_PRIORITY = "idle"  # Timer backups run in the background at this disk priority: "idle", "low" or "normal".
+BACKUP_BANDWIDTH_LIMIT_MB = 0  # Max MB per second timer backups read. 0 for unlimited.
 ROTATE_LOGS_EVERY_X_RUNS = 10  # -1 if you don't want to log to file.
 LOG_LEVEL = "INFO"
 LOGS_DIR = "logs"
@@ -29,119 +40,331 @@ WAIT_FOR_RCON_PORT = (
 WAIT_FOR_RCON_PORT_TIMEOUT = (
     30  # How long to wait in seconds for the RCON port to be available.
 )
+LAUNCH_METRICS_FILE = "launch_metrics.jsonl"  # Launch -> port open -> rcon ready timings. None to disable.
+HEALTH_CHECK_EVERY_X_SECONDS = 30  # Fallback process check. Exits of tracked servers are detected immediately.
+WATCHER_STATE_FILE = "watcher_state.json"  # Keeps backup/restart timers across watcher restarts. None to disable.
+PLAYER_POLL_EVERY_X_SECONDS = 60  # Logs players joining / leaving. -1 to disable.
+PLAYER_HISTORY_FILE = "player_sessions.jsonl"  # Finished player sessions. None to disable.
+PLAYER_AWARE_MAINTENANCE = False  # Enables the 4 settings below. When off, timed restarts and backups run on time.
+RESTART_MAX_PLAYERS = 0  # Timed restarts wait until at most this many players are online...
+RESTART_MAX_DELAY_MINUTES = 60  # ...but no longer than this. 0 to always restart on time.
+IDLE_MAX_PLAYERS = 0  # The server counts as idle with at most this many players online.
+RUN_EARLY_WHEN_IDLE_AFTER = 0.5  # When idle, run backups / restarts once this fraction of their interval has passed. -1 to disable.
+RESOURCE_SAMPLE_EVERY_X_SECONDS = 30  # Samples server memory / cpu / threads / io. -1 to disable.
+MEMORY_RESTART_THRESHOLD_MB = 12288  # Restart when the server's memory use is (or is projected to be) over this. -1 to disable.
+MEMORY_RESTART_HORIZON_MINUTES = 30  # Restart early if memory growth will cross the threshold within this long.
+FOLLOW_SERVER_LOG = True  # Reacts to crashes etc. in the server log as soon as they're logged.
+SERVER_LOG_FILE = None  # Log followed with FOLLOW_SERVER_LOG. Defaults to Pal/Saved/Logs/Pal.log in the server dir.
+LOG_FOLLOWER_STATE_FILE = "log_follower_state.json"  # Remembers how far the server log was read. None to disable.
+METRICS_PORT = 9877  # Serves Prometheus-style metrics on http://METRICS_HOST:METRICS_PORT/metrics. None to disable.
+METRICS_HOST = "127.0.0.1"
+VALIDATE_EVERY_X_HOURS = 168  # Full steamcmd validate schedule, otherwise steamcmd only runs when there's a new build. -1 to disable.
+VALIDATE_IF_CRASHED_WITHIN_SECONDS = 120  # Validate the install on the next launch if the server dies this soon after launching.
 
 
-STEAMCMD_DIR = os.getenv("steamcmd_dir")
-SERVER_NAME = os.getenv("palworld_server_name")
-SERVER_IP = os.getenv("palworld_server_ip")
-RCON_PASSWORD = os.getenv("palworld_rcon_password")
-RCON_PORT = int(os.getenv("palworld_rcon_port"))
+@dataclass
+class WatcherSettings:
+    """The watcher's settings, defaulting to the variables above. See them for what each one does.
 
-LOOP_SLEEP = 30
+    One per watched server, so several watchers (see `supervisor.py`) can run side by side.
+    """
 
+    automatic_restart: bool = AUTOMATIC_RESTART
+    automatic_restart_every_x_minutes: int = AUTOMATIC_RESTART_EVERY_X_MINUTES
+    backup_on_restart: bool = BACKUP_ON_RESTART
+    backup_every_x_minutes: int = BACKUP_EVERY_X_MINUTES
+    wait_for_rcon_port: bool = WAIT_FOR_RCON_PORT
+    wait_for_rcon_port_timeout: int = WAIT_FOR_RCON_PORT_TIMEOUT
+    health_check_every_x_seconds: int = HEALTH_CHECK_EVERY_X_SECONDS
+    watcher_state_file: str = WATCHER_STATE_FILE
+    player_poll_every_x_seconds: int = PLAYER_POLL_EVERY_X_SECONDS
+    player_aware_maintenance: bool = PLAYER_AWARE_MAINTENANCE
+    restart_max_players: int = RESTART_MAX_PLAYERS
+    restart_max_delay_minutes: int = RESTART_MAX_DELAY_MINUTES
+    idle_max_players: int = IDLE_MAX_PLAYERS
+    run_early_when_idle_after: float = RUN_EARLY_WHEN_IDLE_AFTER
+    resource_sample_every_x_seconds: int = RESOURCE_SAMPLE_EVERY_X_SECONDS
+    memory_restart_threshold_mb: int = MEMORY_RESTART_THRESHOLD_MB
+    memory_restart_horizon_minutes: int = MEMORY_RESTART_HORIZON_MINUTES
+    follow_server_log: bool = FOLLOW_SERVER_LOG
+    server_log_file: str = SERVER_LOG_FILE
+    log_follower_state_file: str = LOG_FOLLOWER_STATE_FILE
+    validate_if_crashed_within_seconds: int = VALIDATE_IF_CRASHED_WITHIN_SECONDS
 
-def calculate_minutes_elapsed(last_time):
-    return (time.time() - last_time) / 60
+    def maintenance_policy(self) -> MaintenancePolicy:
+        """None unless `player_aware_maintenance` is on."""
+        if not self.player_aware_maintenance:
+            return None
+        return MaintenancePolicy(
+            restart_max_players=self.restart_max_players,
+            restart_max_delay_seconds=self.restart_max_delay_minutes * 60,
+            idle_max_players=self.idle_max_players,
+            run_early_after=self.run_early_when_idle_after,
+        )
+
+
+def palworld_util_args() -> dict:
+    """`PalworldUtil` arguments from the variables above. Also the defaults of `supervisor.py` servers."""
+    args = dict(
+        operating_system=OPERATING_SYSTEM,
+        wait_before_restart_seconds=WAIT_BEFORE_RESTART_SECONDS,
+        backup_mode=BACKUP_MODE,
+        archive_codec=ARCHIVE_CODEC,
+        keep_hourly_backups=BACKUP_KEEP_HOURLY,
+        keep_daily_backups=BACKUP_KEEP_DAILY,
+        keep_weekly_backups=BACKUP_KEEP_WEEKLY,
+        backup_io_priority=BACKUP_IO_PRIORITY,
+        backup_bandwidth_limit=BACKUP_BANDWIDTH_LIMIT_MB * 2**20 or None,
+        validate_every_x_hours=VALIDATE_EVERY_X_HOURS,
+    )
+    if ROTATE_AFTER_X_BACKUPS > 0:
+        args["rotate_after_x_backups"] = ROTATE_AFTER_X_BACKUPS
+    else:
+        args["rotate_backups"] = False
+    return args
+
+
+def setup_file_logging(logs_dir: str = LOGS_DIR, level: str = LOG_LEVEL, retention: int = ROTATE_LOGS_EVERY_X_RUNS):
+    """Adds a log file per run in `logs_dir`, keeping the last `retention` files. Nothing if retention <= 0."""
+    if retention <= 0:
+        return
+    logs_path = Path(logs_dir)
+    if not os.path.exists(logs_path):
+        logger.info(f"Creating logs dir: {logs_path}")
+        logs_path.mkdir(parents=True, exist_ok=True)
+    # Add logging sink to file and rotate every `retention` runs/logs.
+    logger.add(
+        logs_path / "log_{time}.txt",
+        level=level,
+        colorize=False,
+        backtrace=True,
+        diagnose=True,
+        retention=retention,
+    )
 
 
-def log_initial_timers():
-    if AUTOMATIC_RESTART:
+def log_initial_timers(scheduler: Scheduler):
+    if "restart" in scheduler.jobs:
         logger.info(
-            f"Next server restart in: {AUTOMATIC_RESTART_EVERY_X_MINUTES} minutes"
+            f"Next server restart in: {scheduler.seconds_until('restart') / 60:.0f} minutes"
         )
-    if BACKUP_EVERY_X_MINUTES > 0:
-        logger.info(f"Next backup in: {BACKUP_EVERY_X_MINUTES} minutes")
+    if "backup" in scheduler.jobs:
+        logger.info(f"Next backup in: {scheduler.seconds_until('backup') / 60:.0f} minutes")
 
 
-def watcher_loop(
-    pal: PalworldUtil, wait_for_rcon: bool = False, wait_for_rcon_timeout: int = 10
-):
-    last_restart = last_backup = time.time()
-    log_initial_timers()
+def watch_for_server_exit(pal: PalworldUtil, scheduler: Scheduler, on_exit):
+    """Wakes the scheduler with `on_exit` as soon as the tracked server process exits."""
+    if pal.process_tracker.server is None:
+        logger.warning("Server process isn't tracked, exits are only noticed by the periodic health check.")
+        return
 
-    while True:
+    def wait():
+        pal.process_tracker.wait_for_exit()
+        scheduler.post(on_exit)
+
+    threading.Thread(target=wait, name="server_exit_watcher", daemon=True).start()
+
+
+def start_watcher(
+    pal: PalworldUtil,
+    settings: WatcherSettings = None,  # `WatcherSettings()` (the variables above) if not provided.
+    policy: MaintenancePolicy = None,  # Player-aware restart / backup timing. Restarts and backups run on time if not provided.
+) -> Scheduler:
+    """Sets up the watcher's jobs for `pal`. Run them with `run_forever()` on the returned scheduler."""
+    settings = settings or WatcherSettings()
+    scheduler = Scheduler(settings.watcher_state_file)
+    deferred_restart = {}  # "due_since": when a timed restart that's waiting for players became due.
+
+    def player_count() -> int:
+        """Online players, None if the server didn't answer."""
+        if pal.player_poller.poll() is None:
+            return None
+        return len(pal.player_poller.players)
+
+    def take_backup():
+        # Runs in the background so health checks and player polls carry on meanwhile.
+        if pal.backup_worker.submit(trigger="timer"):
+            logger.info("Taking server backup in the background...")
+        logger.info(f"Next backup in: {settings.backup_every_x_minutes} minutes")
+
+    def check_server():
+        if pal.is_server_running():
+            return
+        logger.info("Server process not found, restarting...")
+        pal.player_poller.clear()
         if (
-            BACKUP_EVERY_X_MINUTES > 0
-            and calculate_minutes_elapsed(last_backup) >= BACKUP_EVERY_X_MINUTES
+            pal.last_launch_at is not None
+            and time.time() - pal.last_launch_at < settings.validate_if_crashed_within_seconds
         ):
-            logger.info("Taking server backup...")
-            pal.take_server_backup()
-            last_backup = time.time()
-            logger.info(f"Next backup in: {BACKUP_EVERY_X_MINUTES} minutes")
-
-        if AUTOMATIC_RESTART:
-            minutes_since_last_restart = calculate_minutes_elapsed(last_restart)
-
-            if not check_for_process(pal.palworld_server_proc_name):
-                logger.info(f"Server process not found, restarting...")
-                pal.launch_server(
-                    wait_for_rcon_port=wait_for_rcon,
-                    wait_for_rcon_port_timeout=wait_for_rcon_timeout,
-                )
-                last_restart = time.time()
-                logger.info(
-                    f"Next server restart in: {AUTOMATIC_RESTART_EVERY_X_MINUTES} minutes"
-                )
-
-            elif minutes_since_last_restart >= AUTOMATIC_RESTART_EVERY_X_MINUTES:
-                pal.log_and_broadcast(
-                    f"Restarting server after {minutes_since_last_restart} minutes..."
-                )
-                pal.restart_server(
-                    backup_server=BACKUP_ON_RESTART,
-                    wait_for_rcon_port=wait_for_rcon,
-                    wait_for_rcon_port_timeout=wait_for_rcon_timeout,
-                )
-                last_restart = time.time()
-                pal.log_and_broadcast(
-                    f"Next server restart in: {AUTOMATIC_RESTART_EVERY_X_MINUTES} minutes"
-                )
-
-        time.sleep(LOOP_SLEEP)
+            pal.update_checker.request_validation(
+                f"server exited {time.time() - pal.last_launch_at:.0f}s after launch"
+            )
+        # Get the server back up first, new builds are installed on the next timed restart.
+        pal.launch_server(
+            wait_for_rcon_port=settings.wait_for_rcon_port,
+            wait_for_rcon_port_timeout=settings.wait_for_rcon_port_timeout,
+            repairs_only=True,
+        )
+        watch_for_server_exit(pal, scheduler, check_server)
+        if "restart" in scheduler.jobs:
+            scheduler.reschedule("restart")
+            deferred_restart.clear()
+            logger.info(
+                f"Next server restart in: {settings.automatic_restart_every_x_minutes} minutes"
+            )
 
+    def restart(reason: str):
+        # Whatever triggered it, the next timed restart starts a fresh deferral.
+        deferred_restart.clear()
+        pal.log_and_broadcast(reason)
+        pal.restart_server(
+            backup_server=settings.backup_on_restart,
+            wait_for_rcon_port=settings.wait_for_rcon_port,
+            wait_for_rcon_port_timeout=settings.wait_for_rcon_port_timeout,
+        )
+        watch_for_server_exit(pal, scheduler, check_server)
+        if "restart" in scheduler.jobs:
+            pal.log_and_broadcast(
+                f"Next server restart in: {settings.automatic_restart_every_x_minutes} minutes"
+            )
 
-def main():
-    if ROTATE_LOGS_EVERY_X_RUNS > 0:
-        logs_path = Path(LOGS_DIR)
-        if not os.path.exists(logs_path):
-            logger.info(f"Creating logs dir: {logs_path}")
-            logs_path.mkdir(exist_ok=True)
-        # Add logging sink to file and rotate every ROTATE_LOGS_EVERY_X_RUNS runs/logs.
-        logger.add(
-            logs_path / "log_{time}.txt",
-            level=LOG_LEVEL,
-            colorize=False,
-            backtrace=True,
-            diagnose=True,
-            retention=ROTATE_LOGS_EVERY_X_RUNS,
+    def timed_restart():
+        if policy is not None:
+            first_deferral = "due_since" not in deferred_restart
+            due_since = deferred_restart.setdefault("due_since", time.time())
+            count = player_count()
+            if policy.should_defer_restart(count, due_since):
+                if first_deferral:
+                    pal.log_and_broadcast(
+                        f"Restart due, waiting up to {policy.restart_max_delay_seconds / 60:.0f} "
+                        f"minutes for at most {policy.restart_max_players} players online."
+                    )
+                scheduler.reschedule("restart", 60)
+                return
+        restart(f"Restarting server after {settings.automatic_restart_every_x_minutes} minutes...")
+
+    def poll_players():
+        count = player_count()
+        if policy is None or not policy.is_idle(count):
+            return
+        # Pull heavy maintenance forward while nobody is around to notice it.
+        for name in ("backup", "restart"):
+            if name in scheduler.jobs and policy.should_run_early(
+                scheduler.jobs[name].interval, scheduler.seconds_until(name), count
+            ):
+                logger.info(f"Server is idle, running {name} early.")
+                scheduler.reschedule(name)
+                if name == "backup":
+                    take_backup()
+                else:
+                    # Do a validate that's due before the next restart now, while it hurts nobody.
+                    if pal.update_checker.validation_due(within_seconds=scheduler.jobs[name].interval):
+                        pal.update_checker.request_validation("validate due soon and server is idle")
+                    restart("Server is idle, restarting early for maintenance...")
+
+    def sample_resources():
+        if pal.resource_sampler.sample() is None or settings.memory_restart_threshold_mb <= 0:
+            return
+        reason = pal.resource_sampler.memory_restart_reason(
+            settings.memory_restart_threshold_mb * 2**20,
+            horizon_seconds=settings.memory_restart_horizon_minutes * 60,
+        )
+        if reason:
+            if "restart" in scheduler.jobs:
+                scheduler.reschedule("restart")  # A fresh server doesn't need its timed restart soon.
+            restart(f"Restarting server, {reason}...")
+
+    def log_player_changes(diff):
+        for player in diff.joined:
+            logger.info(f"Player joined: {player.name} ({player.key})")
+        for player in diff.left:
+            logger.info(f"Player left: {player.name} ({player.key})")
+
+    pal.player_poller.add_listener(log_player_changes)
+
+    log_events = pal.metrics.counter(
+        "palworld_log_events_total", "Events seen in the server log.", ("kind",)
+    )
+
+    def on_log_event(event):
+        # Called from the follower thread, anything touching the server goes through the scheduler.
+        log_events.inc(kind=event.kind)
+        match event.kind:
+            case "crash" | "fatal":
+                logger.error(f"Server logged a {event.kind}: {event.line}")
+                if settings.automatic_restart:
+                    scheduler.post(check_server)
+            case "hitch":
+                logger.warning(f"Server hitch: {event.line}")
+            case "player_connected" | "player_disconnected":
+                # Refresh the player list now rather than on the next poll.
+                scheduler.post(pal.player_poller.poll)
+            case _:
+                logger.debug(f"Server log {event.kind}: {event.line}")
+
+    if settings.follow_server_log:
+        # Unreal names the log after the project, not the executable.
+        server_log_file = Path(settings.server_log_file or pal.palworld_server_save_dir / "Logs" / "Pal.log")
+        if not server_log_file.exists():
+            logger.warning(f"Server log {server_log_file} doesn't exist, following it once it's created.")
+        log_follower = LogFollower(server_log_file, state_file=settings.log_follower_state_file)
+        log_follower.add_listener(on_log_event)
+        log_follower.start()
+
+    if settings.resource_sample_every_x_seconds > 0:
+        scheduler.add_job("resources", settings.resource_sample_every_x_seconds, sample_resources)
+    if settings.player_poll_every_x_seconds > 0:
+        scheduler.add_job("players", settings.player_poll_every_x_seconds, poll_players)
+    if settings.backup_every_x_minutes > 0:
+        scheduler.add_job("backup", settings.backup_every_x_minutes * 60, take_backup)
+    if settings.automatic_restart:
+        scheduler.add_job(
+            "health_check",
+            settings.health_check_every_x_seconds,
+            check_server,
+            first_run=time.time(),
         )
+        if settings.automatic_restart_every_x_minutes > 0:
+            scheduler.add_job(
+                "restart", settings.automatic_restart_every_x_minutes * 60, timed_restart
+            )
+        watch_for_server_exit(pal, scheduler, check_server)
+
+    log_initial_timers(scheduler)
+    return scheduler
+
+
+def watcher_loop(pal: PalworldUtil, settings: WatcherSettings = None, policy: MaintenancePolicy = None):
+    """Runs the watcher for `pal` on the calling thread, see `start_watcher`."""
+    start_watcher(pal, settings, policy).run_forever()
+
+
+def main():
+    setup_file_logging()
 
     # Create PalworldUtil instance with required vars only.
     pal = PalworldUtil(
-        STEAMCMD_DIR,
-        SERVER_NAME,
-        SERVER_IP,
-        RCON_PORT,
-        RCON_PASSWORD,
-        operating_system=OPERATING_SYSTEM,
+        os.getenv("steamcmd_dir"),
+        os.getenv("palworld_server_name"),
+        os.getenv("palworld_server_ip"),
+        int(os.getenv("palworld_rcon_port")),
+        os.getenv("palworld_rcon_password"),
+        launch_metrics_file=LAUNCH_METRICS_FILE,
+        player_history_file=PLAYER_HISTORY_FILE,
+        **palworld_util_args(),
     )
 
-    if ROTATE_AFTER_X_BACKUPS > 0:
-        pal.rotate_after_x_backups = ROTATE_AFTER_X_BACKUPS
-    else:
-        pal.rotate_backups = False
-
-    pal.wait_before_restart_seconds = WAIT_BEFORE_RESTART_SECONDS
+    if METRICS_PORT:
+        pal.start_metrics_server(METRICS_HOST, METRICS_PORT)
 
+    settings = WatcherSettings()
     try:
-        watcher_loop(
-            pal,
-            wait_for_rcon=WAIT_FOR_RCON_PORT,
-            wait_for_rcon_timeout=WAIT_FOR_RCON_PORT_TIMEOUT,
-        )
+        watcher_loop(pal, settings, policy=settings.maintenance_policy())
     except KeyboardInterrupt:
         logger.info("Caught keyboard interrupt, ending server_watcher...")
         sys.exit(0)
 
 
-main()
+# Guarded so archive backups' worker processes (spawned on windows) don't re-run the watcher.
+if __name__ == "__main__":
+    main()
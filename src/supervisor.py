@@ -0,0 +1,241 @@
+"""Runs the server watcher for several palworld servers on one host, configured from a json file.
+
+Every instance gets its own `PalworldUtil` (install dir, ports, rcon pool, pidfile, backups) and its
+own watcher schedule on a separate thread. Its state files live in `$instances_dir/<name>/`, so
+instances never share a timer, pidfile or backup catalog. Each server can be pinned to its own cpu
+cores (`cpu_affinity`) and given a process priority on launch, so worlds don't compete for cores.
+
+The config is json with `servers` (a list), optional `defaults` applied to every server and
+`instances_dir`, `logs_dir`, `log_level`, `rotate_logs_every_x_runs`. Server keys are `PalworldUtil`
+arguments, plus `name`, `metrics_host` / `metrics_port` and `watcher` (`WatcherSettings` fields,
+merged with the ones in `defaults`). See `servers.example.json`. Anything not configured defaults
+to the variables at the top of `server_watcher.py`, like a single watched server.
+
+Run from `src/`:
+    python supervisor.py -config servers.json
+"""
+
+from server_watcher import LOG_LEVEL, LOGS_DIR, ROTATE_LOGS_EVERY_X_RUNS, WatcherSettings, palworld_util_args, setup_file_logging, start_watcher
+from utility.palworld_util import PalworldUtil
+from utility.scheduler import Scheduler
+
+import argparse
+import inspect
+import json
+import sys
+import threading
+
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+
+import psutil
+from loguru import logger
+
+
+PALWORLD_UTIL_ARGS = set(inspect.signature(PalworldUtil).parameters)
+REQUIRED_ARGS = ("steamcmd_dir", "server_ip", "rcon_port", "rcon_password")
+INSTANCE_KEYS = {"name", "watcher", "metrics_host", "metrics_port"}  # Not passed to `PalworldUtil`.
+
+
+@dataclass
+class InstanceConfig:
+    name: str
+    state_dir: Path  # Pidfile, backups, watcher state, ...
+    pal_args: dict  # `PalworldUtil` keyword arguments.
+    watcher: WatcherSettings = field(default_factory=WatcherSettings)
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = None  # No metrics server if not provided.
+
+
+def _instance_config(server: dict, defaults: dict, instances_dir: Path) -> InstanceConfig:
+    name = server.get("name")
+    if not name:
+        raise ValueError(f"Server without a name in config: {server}")
+
+    merged = {**defaults, **server}
+    unknown = set(merged) - PALWORLD_UTIL_ARGS - INSTANCE_KEYS
+    if unknown:
+        raise ValueError(f"Unknown settings for server {name}: {sorted(unknown)}")
+    missing = [arg for arg in REQUIRED_ARGS if arg not in merged]
+    if missing:
+        raise ValueError(f"Server {name} is missing: {missing}")
+
+    watcher_args = {**defaults.get("watcher", {}), **server.get("watcher", {})}
+    watcher_fields = {watcher_field.name for watcher_field in fields(WatcherSettings)}
+    if set(watcher_args) - watcher_fields:
+        raise ValueError(f"Unknown watcher settings for server {name}: {sorted(set(watcher_args) - watcher_fields)}")
+
+    state_dir = instances_dir / name
+    watcher_args.setdefault("watcher_state_file", str(state_dir / "watcher_state.json"))
+    watcher_args.setdefault("log_follower_state_file", str(state_dir / "log_follower_state.json"))
+
+    pal_args = {key: value for key, value in merged.items() if key not in INSTANCE_KEYS}
+    pal_args.setdefault("server_name", name)
+    pal_args.setdefault("backup_dir", str(state_dir / "backups"))
+    pal_args.setdefault("pidfile", str(state_dir / "palserver.pid"))
+    pal_args.setdefault("update_state_file", str(state_dir / "steam_update.json"))
+    pal_args.setdefault("launch_metrics_file", str(state_dir / "launch_metrics.jsonl"))
+    pal_args.setdefault("player_history_file", str(state_dir / "player_sessions.jsonl"))
+    for key, value in palworld_util_args().items():
+        pal_args.setdefault(key, value)
+    if pal_args.get("palword_server_dir"):
+        pal_args["palword_server_dir"] = Path(pal_args["palword_server_dir"])
+        # Each instance updates its own install instead of steamcmd's default one.
+        pal_args.setdefault("force_install_dir", True)
+
+    return InstanceConfig(
+        name=name,
+        state_dir=state_dir,
+        pal_args=pal_args,
+        watcher=WatcherSettings(**watcher_args),
+        metrics_host=merged.get("metrics_host", "127.0.0.1"),
+        metrics_port=merged.get("metrics_port"),
+    )
+
+
+def _check_isolation(instances: list) -> None:
+    """Raises ValueError for settings two instances can't share, warns about shared cpu cores."""
+    if len(instances) > 1:
+        for instance in instances:
+            if not instance.pal_args.get("palword_server_dir"):
+                raise ValueError(
+                    f"Server {instance.name} needs its own palword_server_dir when running several servers."
+                )
+
+    unique = {
+        "name": lambda instance: instance.name,
+        "palword_server_dir": lambda instance: instance.pal_args.get("palword_server_dir") and Path(instance.pal_args["palword_server_dir"]).resolve(),
+        "server_port": lambda instance: instance.pal_args.get("server_port", 8211),
+        "rcon_port": lambda instance: (instance.pal_args["server_ip"], instance.pal_args["rcon_port"]),
+        "metrics_port": lambda instance: instance.metrics_port,
+    }
+    for setting, key in unique.items():
+        seen = {}
+        for instance in instances:
+            value = key(instance)
+            if value is None:
+                continue
+            if value in seen:
+                raise ValueError(f"Servers {seen[value]} and {instance.name} have the same {setting}: {value}")
+            seen[value] = instance.name
+
+    cpu_count = psutil.cpu_count()
+    cores = {}
+    for instance in instances:
+        for core in instance.pal_args.get("cpu_affinity") or ():
+            if not 0 <= core < cpu_count:
+                raise ValueError(f"Server {instance.name} cpu_affinity has core {core}, this host has {cpu_count}.")
+            if core in cores:
+                logger.warning(f"Servers {cores[core]} and {instance.name} are both pinned to core {core}.")
+            cores.setdefault(core, instance.name)
+
+
+def load_config(path: str) -> tuple:
+    """Returns (top level config, [InstanceConfig]) from the json config at `path`."""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    instances_dir = Path(config.get("instances_dir", "instances"))
+    defaults = config.get("defaults", {})
+    instances = [_instance_config(server, defaults, instances_dir) for server in config.get("servers", [])]
+    if not instances:
+        raise ValueError(f"No servers in {path}.")
+    _check_isolation(instances)
+    return config, instances
+
+
+def _tag_instance(record: dict) -> None:
+    instance = record["extra"].get("instance")
+    if instance:
+        record["message"] = f"[{instance}] {record['message']}"
+
+
+class Supervisor:
+    def __init__(self, instances: list) -> None:
+        self.instances = instances
+        self.pals: dict[str, PalworldUtil] = {}
+        self.schedulers: dict[str, Scheduler] = {}
+        self._steamcmd_locks: dict[Path, threading.Lock] = {}
+        self._threads: list[threading.Thread] = []
+
+    def create(self, instance: InstanceConfig) -> PalworldUtil:
+        instance.state_dir.mkdir(parents=True, exist_ok=True)
+        pal_args = dict(instance.pal_args)
+        # steamcmd can't run twice at once out of the same dir.
+        steamcmd_dir = Path(pal_args["steamcmd_dir"]).resolve()
+        pal_args.setdefault(
+            "steamcmd_lock", self._steamcmd_locks.setdefault(steamcmd_dir, threading.Lock())
+        )
+        pal = PalworldUtil(**pal_args)
+        if instance.metrics_port:
+            pal.start_metrics_server(instance.metrics_host, instance.metrics_port)
+        return pal
+
+    def start(self) -> None:
+        """Starts a watcher thread per instance."""
+        for instance in self.instances:
+            with logger.contextualize(instance=instance.name):
+                self.pals[instance.name] = self.create(instance)
+            thread = threading.Thread(
+                target=self._run, args=(instance,), name=f"watcher_{instance.name}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self, instance: InstanceConfig) -> None:
+        with logger.contextualize(instance=instance.name):
+            try:
+                pal = self.pals[instance.name]
+                scheduler = start_watcher(pal, instance.watcher, policy=instance.watcher.maintenance_policy())
+                self.schedulers[instance.name] = scheduler
+                scheduler.run_forever()
+            except Exception:
+                logger.exception(f"Watcher for {instance.name} stopped.")
+
+    def join(self, timeout: float = None) -> bool:
+        """Waits for every watcher thread to end. Returns False if some are still running after `timeout`."""
+        for thread in self._threads:
+            thread.join(timeout)
+        return not any(thread.is_alive() for thread in self._threads)
+
+    def stop(self) -> None:
+        """Stops the watchers. The game servers keep running."""
+        for scheduler in self.schedulers.values():
+            scheduler.stop()
+        for pal in self.pals.values():
+            pal.broadcaster.close(timeout=5)
+            if pal.metrics_server is not None:
+                pal.metrics_server.close()
+
+
+def get_cli_args():
+    parser = argparse.ArgumentParser(description="Watch several palworld servers.")
+    parser.add_argument("-config", default="servers.json", help="Json config, see `servers.example.json`.")
+    return parser.parse_args()
+
+
+def main():
+    args = get_cli_args()
+    config, instances = load_config(args.config)
+    logger.configure(patcher=_tag_instance)
+    setup_file_logging(
+        config.get("logs_dir", LOGS_DIR),
+        config.get("log_level", LOG_LEVEL),
+        config.get("rotate_logs_every_x_runs", ROTATE_LOGS_EVERY_X_RUNS),
+    )
+
+    supervisor = Supervisor(instances)
+    supervisor.start()
+    logger.info(f"Supervising {len(instances)} servers: {', '.join(instance.name for instance in instances)}")
+    try:
+        # Joined in short steps so ctrl+c isn't held up.
+        while not supervisor.join(timeout=1):
+            pass
+    except KeyboardInterrupt:
+        logger.info("Caught keyboard interrupt, ending supervisor...")
+        supervisor.stop()
+        sys.exit(0)
+
+
+# Guarded so archive backups' worker processes (spawned on windows) don't re-run the supervisor.
+if __name__ == "__main__":
+    main()
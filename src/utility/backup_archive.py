@@ -0,0 +1,239 @@
+"""Streams a folder into a compressed tar archive, compressing on all cores.
+
+The tar stream is cut into fixed size blocks and each block is compressed independently in a process
+pool. Every supported codec allows concatenated streams/frames/members, so the result is a normal
+archive that `tar` or `tarfile` can read. No uncompressed copy of the folder is ever written.
+"""
+
+import bz2
+import collections
+import gzip
+import hashlib
+import lzma
+import os
+import tarfile
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# codec: (archive suffix, default level)
+CODECS = {
+    "gzip": (".tar.gz", 6),
+    "bz2": (".tar.bz2", 9),
+    "xz": (".tar.xz", 6),
+    "zstd": (".tar.zst", 3),
+}
+
+
+@dataclass
+class ArchiveStats:
+    path: Path
+    files: int = 0
+    input_bytes: int = 0  # Uncompressed tar stream size.
+    output_bytes: int = 0
+    sha256: str = None  # Of the archive file.
+    seconds: float = 0.0
+    file_hashes: dict = None  # {path relative to the source dir: {"size", "sha256"}} of the archived files.
+
+    @property
+    def throughput(self) -> float:
+        """Uncompressed bytes per second."""
+        return self.input_bytes / self.seconds if self.seconds else 0.0
+
+
+def _compress_block(codec: str, level: int, block: bytes) -> bytes:
+    if codec == "gzip":
+        return gzip.compress(block, compresslevel=level, mtime=0)
+    if codec == "bz2":
+        return bz2.compress(block, compresslevel=level)
+    if codec == "xz":
+        return lzma.compress(block, preset=level)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(block)
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+class _HashingReader:
+    """Hashes what `tarfile` reads from a file, so the hashes match the archived bytes exactly."""
+
+    def __init__(self, file) -> None:
+        self.file = file
+        self.hasher = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file.read(size)
+        self.hasher.update(data)
+        return data
+
+
+class _ParallelCompressWriter:
+    """File-like sink for `tarfile` that hands fixed size blocks to a process pool.
+
+    Compressed blocks are written out in submission order. At most `max_pending` blocks are in
+    flight, which bounds memory no matter how big the archive gets.
+    """
+
+    def __init__(
+        self,
+        out_file,
+        executor: ProcessPoolExecutor,
+        codec: str,
+        level: int,
+        block_size: int,
+        max_pending: int,
+        progress: callable = None,
+    ) -> None:
+        self.out_file = out_file
+        self.progress = progress
+        self.executor = executor
+        self.codec = codec
+        self.level = level
+        self.block_size = block_size
+        self.max_pending = max_pending
+
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.hasher = hashlib.sha256()
+        self._buffer = bytearray()
+        self._pending = collections.deque()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        self.input_bytes += len(data)
+        if self.progress:
+            self.progress(len(data))
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[: self.block_size]))
+            del self._buffer[: self.block_size]
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(
+            self.executor.submit(_compress_block, self.codec, self.level, block)
+        )
+        while len(self._pending) >= self.max_pending:
+            self._write_next()
+
+    def _write_next(self) -> None:
+        compressed = self._pending.popleft().result()
+        self.out_file.write(compressed)
+        self.hasher.update(compressed)
+        self.output_bytes += len(compressed)
+
+    def flush(self) -> None:
+        """Compresses whatever is buffered and waits for every block to be written."""
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+        while self._pending:
+            self._write_next()
+
+
+def create_archive(
+    source_dir: str,
+    destination: str,
+    codec: str = "gzip",
+    level: int = None,  # Codec default if not provided.
+    workers: int = None,  # Defaults to os.cpu_count().
+    block_size: int = 8 * 1024 * 1024,
+    progress: callable = None,  # Called with the bytes archived so far, may raise to abort.
+) -> ArchiveStats:
+    """Archives `source_dir` to `destination` (suffix added for the codec) and returns stats."""
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec: {codec}, expected one of {list(CODECS)}")
+    if codec == "zstd" and zstandard is None:
+        raise RuntimeError("zstd archives need the `zstandard` package: pip install zstandard")
+
+    suffix, default_level = CODECS[codec]
+    level = default_level if level is None else level
+    workers = workers or os.cpu_count() or 1
+    source_dir = Path(source_dir)
+    destination = Path(f"{destination}{suffix}")
+    temp_destination = destination.with_name(destination.name + ".partial")
+
+    stats = ArchiveStats(path=destination, file_hashes={})
+    start_time = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor, open(
+            temp_destination, "wb"
+        ) as out_file:
+            writer = _ParallelCompressWriter(
+                out_file,
+                executor,
+                codec,
+                level,
+                block_size,
+                max_pending=workers * 2,
+                progress=progress,
+            )
+            with tarfile.open(fileobj=writer, mode="w|") as tar:
+                for root, _, filenames in os.walk(source_dir):
+                    for filename in filenames:
+                        path = Path(root) / filename
+                        relative_path = path.relative_to(source_dir)
+                        tarinfo = tar.gettarinfo(path, arcname=(Path(source_dir.name) / relative_path).as_posix())
+                        if not tarinfo.isreg():
+                            tar.addfile(tarinfo)
+                            continue
+                        with open(path, "rb") as f:
+                            reader = _HashingReader(f)
+                            tar.addfile(tarinfo, reader)
+                        stats.file_hashes[relative_path.as_posix()] = {
+                            "size": tarinfo.size,
+                            "sha256": reader.hasher.hexdigest(),
+                        }
+                        stats.files += 1
+            writer.flush()
+        os.replace(temp_destination, destination)
+    except BaseException:
+        if temp_destination.exists():
+            os.remove(temp_destination)
+        raise
+
+    stats.seconds = time.perf_counter() - start_time
+    stats.input_bytes = writer.input_bytes
+    stats.output_bytes = writer.output_bytes
+    stats.sha256 = writer.hasher.hexdigest()
+    logger.info(
+        f"Archived {stats.files} files ({stats.input_bytes} -> {stats.output_bytes} bytes, "
+        f"{codec} level {level}, {workers} workers) in {stats.seconds:.2f}s "
+        f"({stats.throughput / 1024 / 1024:.1f} MiB/s): {destination}"
+    )
+    return stats
+
+
+def extract_archive(archive_path: str, destination_dir: str) -> Path:
+    """Extracts an archive made by `create_archive` into `destination_dir`. Returns `destination_dir`.
+
+    The archive holds the source folder itself, e.g. `destination_dir/Saved/...`.
+    """
+    archive_path = Path(archive_path)
+    destination_dir = Path(destination_dir)
+    destination_dir.mkdir(parents=True, exist_ok=True)
+    with open(archive_path, "rb") as f:
+        if archive_path.name.endswith(CODECS["zstd"][0]):
+            if zstandard is None:
+                raise RuntimeError("zstd archives need the `zstandard` package: pip install zstandard")
+            fileobj = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            mode = "r|"
+        else:
+            fileobj, mode = f, "r:*"
+        with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+            for member in tar:
+                if hasattr(tarfile, "data_filter"):
+                    tar.extract(member, destination_dir, filter="data")
+                else:
+                    if member.name.startswith("/") or ".." in Path(member.name).parts:
+                        raise ValueError(f"Refusing to extract {member.name} from {archive_path}")
+                    tar.extract(member, destination_dir)
+    return destination_dir
@@ -0,0 +1,145 @@
+"""SQLite catalog of backups with grandfather-father-son retention.
+
+Rotation is driven entirely by what the catalog recorded when each backup was taken, never by
+directory scans or file mtimes, so touching a backup can't change what gets deleted.
+"""
+
+import datetime
+import sqlite3
+import threading
+import time
+
+from dataclasses import dataclass, fields
+from pathlib import Path
+
+from loguru import logger
+
+
+@dataclass
+class BackupRecord:
+    name: str
+    mode: str  # "copy", "incremental" or "archive".
+    path: str
+    created_at: float = None  # Unix timestamp, defaults to now.
+    size: int = None  # Bytes of saved data.
+    file_count: int = None
+    checksum: str = None
+    trigger: str = "manual"  # "timer", "restart", "manual", "imported", ...
+    id: int = None
+
+    def __post_init__(self):
+        if self.created_at is None:
+            self.created_at = time.time()
+
+
+@dataclass
+class RetentionPolicy:
+    """Keep the newest `keep_last` backups, plus the newest backup of each of the last N hours/days/weeks."""
+
+    keep_last: int = 5
+    keep_hourly: int = 0
+    keep_daily: int = 0
+    keep_weekly: int = 0
+
+
+class BackupCatalog:
+    def __init__(self, db_path: str) -> None:
+        self.db_path = Path(db_path)
+        self.is_new = not self.db_path.exists()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS backups (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT UNIQUE NOT NULL,
+                    mode TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    size INTEGER,
+                    file_count INTEGER,
+                    checksum TEXT,
+                    trigger TEXT
+                )"""
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS backups_created_at ON backups (created_at)"
+            )
+
+    def add(self, record: BackupRecord) -> BackupRecord:
+        columns = [f.name for f in fields(BackupRecord) if f.name != "id"]
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                f"INSERT INTO backups ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [getattr(record, column) for column in columns],
+            )
+        record.id = cursor.lastrowid
+        return record
+
+    def update(self, name: str, **values) -> None:
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with self._lock, self._db:
+            self._db.execute(
+                f"UPDATE backups SET {assignments} WHERE name = ?",
+                [*values.values(), name],
+            )
+
+    def remove(self, name: str) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM backups WHERE name = ?", (name,))
+
+    def get(self, name: str) -> BackupRecord:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM backups WHERE name = ?", (name,)
+            ).fetchone()
+        return BackupRecord(**row) if row else None
+
+    def list(self, mode: str = None, newest_first: bool = True) -> list:
+        query = "SELECT * FROM backups"
+        params = []
+        if mode:
+            query += " WHERE mode = ?"
+            params.append(mode)
+        query += f" ORDER BY created_at {'DESC' if newest_first else 'ASC'}, id DESC"
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [BackupRecord(**row) for row in rows]
+
+    def latest(self) -> BackupRecord:
+        records = self.list()
+        return records[0] if records else None
+
+    def select_expired(self, policy: RetentionPolicy) -> list:
+        """Backups not kept by `policy`, oldest first."""
+        records = self.list(newest_first=True)
+        keep = {record.id for record in records[: policy.keep_last]}
+
+        buckets = (
+            (policy.keep_hourly, lambda t: t.strftime("%Y-%m-%d %H")),
+            (policy.keep_daily, lambda t: t.strftime("%Y-%m-%d")),
+            (policy.keep_weekly, lambda t: t.isocalendar()[:2]),
+        )
+        for keep_count, bucket_of in buckets:
+            if keep_count <= 0:
+                continue
+            seen_buckets = set()
+            for record in records:
+                bucket = bucket_of(datetime.datetime.fromtimestamp(record.created_at))
+                if bucket in seen_buckets:
+                    continue
+                if len(seen_buckets) >= keep_count:
+                    break
+                # Newest first, so the first backup seen in a bucket is the one to keep.
+                seen_buckets.add(bucket)
+                keep.add(record.id)
+
+        expired = [record for record in records if record.id not in keep]
+        expired.reverse()
+        if expired:
+            logger.debug(f"Retention policy {policy} expires {len(expired)} backups.")
+        return expired
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,226 @@
+"""Content-addressed, deduplicating backup store for palworld saves.
+
+Every unique file is stored once under `objects/` named by its sha256, and a snapshot is just a
+small json manifest mapping relative paths to blobs. Files whose size and mtime match the previous
+snapshot aren't even read again, so frequent snapshots of a mostly unchanged save dir are cheap.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+import time
+
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class SnapshotStats:
+    name: str
+    files: int = 0
+    bytes: int = 0  # Total size of the snapshotted files.
+    new_blobs: int = 0
+    new_bytes: int = 0  # Bytes actually written to the store.
+    checksum: str = None  # sha256 of the manifest, which covers every file's hash.
+    seconds: float = 0.0
+
+
+class BackupStore:
+    def __init__(self, store_dir: str) -> None:
+        self.store_dir = Path(store_dir)
+        self.objects_dir = self.store_dir / "objects"
+        self.snapshots_dir = self.store_dir / "snapshots"
+        self.latest_path = self.snapshots_dir / "LATEST"  # Name of the newest snapshot.
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def manifest_path(self, name: str) -> Path:
+        return self.snapshots_dir / f"{name}.json"
+
+    def list_snapshots(self) -> list:
+        """Snapshot names, oldest first.
+
+        Manifests are written once and never modified, so their mtime is the snapshot time and the
+        manifests themselves don't need to be parsed.
+        """
+        manifests = [(path.stat().st_mtime_ns, path.stem) for path in self.snapshots_dir.glob("*.json")]
+        return [name for _, name in sorted(manifests)]
+
+    def load_manifest(self, name: str) -> dict:
+        with open(self.manifest_path(name), encoding="utf-8") as f:
+            return json.load(f)
+
+    def snapshot(self, source_dir: str, name: str = None, progress: callable = None) -> SnapshotStats:
+        """Stores `source_dir` as a new snapshot and returns what it cost.
+
+        `progress` is called with the bytes read after every chunk, and with `io=False` for the size
+        of unchanged files that weren't read. It may raise to abort the snapshot.
+        """
+        source_dir = Path(source_dir)
+        if name is None:
+            name = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        if self.manifest_path(name).exists():
+            raise FileExistsError(f"Snapshot already exists: {name}")
+
+        start_time = time.perf_counter()
+        stats = SnapshotStats(name=name)
+        previous_files = self._latest_files()
+        files = {}
+
+        for root, _, filenames in os.walk(source_dir):
+            for filename in filenames:
+                path = Path(root) / filename
+                relative_path = path.relative_to(source_dir).as_posix()
+                file_stat = path.stat()
+
+                previous = previous_files.get(relative_path)
+                if (
+                    previous
+                    and previous["size"] == file_stat.st_size
+                    and previous["mtime_ns"] == file_stat.st_mtime_ns
+                    and self.blob_path(previous["hash"]).exists()
+                ):
+                    digest = previous["hash"]
+                    if progress:
+                        progress(file_stat.st_size, io=False)
+                else:
+                    digest, new_bytes = self._store_file(path, progress)
+                    if new_bytes:
+                        stats.new_blobs += 1
+                        stats.new_bytes += new_bytes
+
+                files[relative_path] = {
+                    "hash": digest,
+                    "size": file_stat.st_size,
+                    "mtime_ns": file_stat.st_mtime_ns,
+                    "mode": stat.S_IMODE(file_stat.st_mode),
+                }
+                stats.files += 1
+                stats.bytes += file_stat.st_size
+
+        manifest = {
+            "name": name,
+            "created_at": time.time(),
+            "source": str(source_dir),
+            "files": files,
+        }
+        stats.checksum = self._write_manifest(name, manifest)
+
+        stats.seconds = time.perf_counter() - start_time
+        logger.info(
+            f"Snapshot {name}: {stats.files} files ({stats.bytes} bytes), "
+            f"{stats.new_blobs} new blobs ({stats.new_bytes} bytes) in {stats.seconds:.2f}s."
+        )
+        return stats
+
+    def _latest_files(self) -> dict:
+        try:
+            latest = self.latest_path.read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            latest = None
+        if not latest or not self.manifest_path(latest).exists():
+            # Store from before the pointer existed, or the latest snapshot was deleted.
+            snapshots = self.list_snapshots()
+            if not snapshots:
+                return {}
+            latest = snapshots[-1]
+        return self.load_manifest(latest)["files"]
+
+    def _store_file(self, path: Path, progress: callable = None) -> tuple:
+        """Hashes `path` while copying it into the store. Returns (digest, bytes written)."""
+        hasher = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.objects_dir, prefix=".incoming_")
+        try:
+            with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                while chunk := src.read(CHUNK_SIZE):
+                    hasher.update(chunk)
+                    dst.write(chunk)
+                    if progress:
+                        progress(len(chunk))
+            digest = hasher.hexdigest()
+
+            blob_path = self.blob_path(digest)
+            if blob_path.exists():
+                os.remove(temp_path)
+                return digest, 0
+
+            blob_path.parent.mkdir(exist_ok=True)
+            # Blobs are shared between snapshots (and hardlinked views), never modify them in place.
+            os.chmod(temp_path, stat.S_IREAD)
+            os.replace(temp_path, blob_path)
+            return digest, blob_path.stat().st_size
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _write_manifest(self, name: str, manifest: dict) -> str:
+        """Atomically writes a manifest and returns its sha256."""
+        manifest_bytes = json.dumps(manifest).encode("utf-8")
+        temp_path = self.manifest_path(name).with_suffix(".tmp")
+        with open(temp_path, "wb") as f:
+            f.write(manifest_bytes)
+        os.replace(temp_path, self.manifest_path(name))
+
+        temp_path = self.latest_path.with_suffix(".tmp")
+        temp_path.write_text(name, encoding="utf-8")
+        os.replace(temp_path, self.latest_path)
+        return hashlib.sha256(manifest_bytes).hexdigest()
+
+    def materialize(self, name: str, destination_dir: str, hardlink: bool = True) -> Path:
+        """Recreates snapshot `name` as a normal directory tree at `destination_dir`.
+
+        With `hardlink` the files are hardlinks to the (read-only) blobs, which is near instant and
+        takes no extra space. Falls back to copying if hardlinks aren't supported.
+        """
+        destination_dir = Path(destination_dir)
+        manifest = self.load_manifest(name)
+        for relative_path, entry in manifest["files"].items():
+            destination = destination_dir / relative_path
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            blob_path = self.blob_path(entry["hash"])
+            if hardlink:
+                try:
+                    os.link(blob_path, destination)
+                    continue
+                except OSError as e:
+                    logger.debug(f"Hardlink failed ({e}), copying instead.")
+                    hardlink = False
+            shutil.copyfile(blob_path, destination)
+            os.chmod(destination, entry["mode"])
+            os.utime(destination, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+        logger.info(f"Materialized snapshot {name} -> {destination_dir}")
+        return destination_dir
+
+    def delete_snapshot(self, name: str) -> None:
+        """Deletes a snapshot manifest. Run `gc()` afterwards to free blobs nothing references."""
+        os.remove(self.manifest_path(name))
+        logger.info(f"Deleted snapshot: {name}")
+
+    def gc(self) -> int:
+        """Deletes blobs that no snapshot references. Returns bytes freed."""
+        referenced = set()
+        for manifest_path in self.snapshots_dir.glob("*.json"):
+            referenced.update(entry["hash"] for entry in self.load_manifest(manifest_path.stem)["files"].values())
+
+        freed = 0
+        for blob_path in self.objects_dir.glob("*/*"):
+            if blob_path.name not in referenced:
+                freed += blob_path.stat().st_size
+                os.chmod(blob_path, stat.S_IREAD | stat.S_IWRITE)  # Windows won't delete read-only files.
+                os.remove(blob_path)
+        if freed:
+            logger.info(f"Backup store gc freed {freed} bytes.")
+        return freed
@@ -0,0 +1,199 @@
+"""Runs backups on a background thread at low I/O priority, with progress and cancellation.
+
+The backup code reports every chunk it reads to a `BackupProgress`, which counts bytes, sleeps to
+keep under the bandwidth limit and raises `BackupCancelled` once the job is cancelled. On linux the
+I/O priority is set on the worker thread only (threads and processes it starts inherit it), so the
+game server and the watcher keep their normal priority. Windows only has a process-wide setting,
+which is lowered for the duration of the backup.
+"""
+
+import os
+import sys
+import threading
+import time
+
+from dataclasses import dataclass, field
+
+import psutil
+from loguru import logger
+
+
+class BackupCancelled(Exception):
+    pass
+
+
+class BackupProgress:
+    """Thread safe progress callback, see `copy_tree`, `BackupStore.snapshot` and `create_archive`."""
+
+    def __init__(
+        self,
+        total_bytes: int,  # Expected bytes, only used for the reported fraction.
+        bandwidth_limit: float = None,  # Max bytes read per second, unlimited if not provided.
+        cancel_event: threading.Event = None,
+        log_every_x_seconds: float = 10,
+    ) -> None:
+        self.total_bytes = total_bytes
+        self.bandwidth_limit = bandwidth_limit
+        self.cancel_event = cancel_event or threading.Event()
+        self.log_every_x_seconds = log_every_x_seconds
+        self.done_bytes = 0
+        self.io_bytes = 0  # Bytes actually read, which is what the bandwidth limit applies to.
+        self.started_at = time.monotonic()
+        self._logged_at = self.started_at
+        self._lock = threading.Lock()
+
+    @property
+    def fraction(self) -> float:
+        if not self.total_bytes:
+            return 0.0
+        return min(1.0, self.done_bytes / self.total_bytes)
+
+    def __call__(self, nbytes: int, io: bool = True) -> None:
+        if self.cancel_event.is_set():
+            raise BackupCancelled()
+        with self._lock:
+            self.done_bytes += nbytes
+            if io:
+                self.io_bytes += nbytes
+            now = time.monotonic()
+            delay = 0.0
+            if self.bandwidth_limit:
+                delay = self.io_bytes / self.bandwidth_limit - (now - self.started_at)
+            if now - self._logged_at >= self.log_every_x_seconds:
+                self._logged_at = now
+                logger.info(
+                    f"Backup {self.fraction:.0%} done ({self.done_bytes / 2**20:.0f} of "
+                    f"{self.total_bytes / 2**20:.0f} MB)"
+                )
+        if delay > 0:
+            # Wake up early if the job gets cancelled while throttled.
+            if self.cancel_event.wait(delay):
+                raise BackupCancelled()
+
+
+@dataclass
+class BackupJob:
+    trigger: str
+    progress: BackupProgress
+    started_at: float = field(default_factory=time.time)
+    finished_at: float = None
+    record: object = None  # BackupRecord if the backup finished.
+    error: BaseException = None
+    cancelled: bool = False
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Waits for the job to finish. Returns False on timeout."""
+        return self._done.wait(timeout)
+
+
+def _folder_size(folder) -> int:
+    size = 0
+    for root, _, filenames in os.walk(folder):
+        for filename in filenames:
+            try:
+                size += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return size
+
+
+class BackupWorker:
+    """Takes `PalworldUtil` backups one at a time on a background thread."""
+
+    IO_PRIORITIES = ("idle", "low", "normal")
+
+    def __init__(
+        self,
+        pal,  # PalworldUtil
+        io_priority: str = "idle",  # "idle" only uses otherwise unused disk time, "low" or "normal".
+        bandwidth_limit: float = None,  # Max bytes read per second, unlimited if not provided.
+    ) -> None:
+        if io_priority not in self.IO_PRIORITIES:
+            raise ValueError(f"Unknown backup io priority {io_priority!r}, use one of {self.IO_PRIORITIES}")
+        self.pal = pal
+        self.io_priority = io_priority
+        self.bandwidth_limit = bandwidth_limit
+        self.current: BackupJob = None  # Running job, or the last one.
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self.current is not None and not self.current.done
+
+    def submit(self, trigger: str = "timer", source_dir: str = None) -> BackupJob:
+        """Starts a backup in the background. Returns None if one is already running."""
+        with self._lock:
+            if self.busy:
+                logger.warning(f"Not starting a {trigger} backup, a {self.current.trigger} backup is still running.")
+                return None
+            source_dir = source_dir or self.pal.palworld_server_save_dir
+            progress = BackupProgress(_folder_size(source_dir), self.bandwidth_limit)
+            job = BackupJob(trigger, progress)
+            self.current = job
+        threading.Thread(
+            target=self._run, args=(job, source_dir), name="backup_worker", daemon=True
+        ).start()
+        return job
+
+    def cancel(self, wait: bool = True, timeout: float = None) -> bool:
+        """Cancels the running backup, if any. Returns True if one was cancelled."""
+        job = self.current
+        if job is None or job.done:
+            return False
+        logger.info(f"Cancelling the running {job.trigger} backup.")
+        job.progress.cancel_event.set()
+        if wait:
+            job.wait(timeout)
+        return True
+
+    def wait(self, timeout: float = None) -> bool:
+        """Waits for the running backup, if any. Returns False on timeout."""
+        job = self.current
+        return job is None or job.wait(timeout)
+
+    def _run(self, job: BackupJob, source_dir) -> None:
+        restore_priority = self._lower_io_priority()
+        try:
+            job.record = self.pal.take_server_backup(
+                trigger=job.trigger, source_dir=source_dir, progress=job.progress
+            )
+            seconds = time.monotonic() - job.progress.started_at
+            logger.info(f"{job.trigger.capitalize()} backup finished in {seconds:.1f}s.")
+        except BackupCancelled:
+            job.cancelled = True
+            logger.info(f"{job.trigger.capitalize()} backup cancelled.")
+        except Exception as e:
+            job.error = e
+            logger.exception(f"{job.trigger.capitalize()} backup failed.")
+        finally:
+            if restore_priority:
+                restore_priority()
+            job.finished_at = time.time()
+            job._done.set()
+
+    def _lower_io_priority(self) -> callable:
+        """Lowers the I/O priority for this thread (process on windows). Returns an undo callable."""
+        if self.io_priority == "normal":
+            return None
+        try:
+            if sys.platform == "win32":
+                process = psutil.Process()
+                previous = process.ionice()
+                process.ionice(psutil.IOPRIO_VERYLOW if self.io_priority == "idle" else psutil.IOPRIO_LOW)
+                return lambda: process.ionice(previous)
+            if sys.platform.startswith("linux"):
+                # Linux threads are scheduled like processes, with the native thread id as pid.
+                thread = psutil.Process(threading.get_native_id())
+                if self.io_priority == "idle":
+                    thread.ionice(psutil.IOPRIO_CLASS_IDLE)
+                else:
+                    thread.ionice(psutil.IOPRIO_CLASS_BE, 7)
+                return None  # The thread exits after the backup.
+        except (psutil.Error, OSError, AttributeError) as e:
+            logger.debug(f"Couldn't lower backup io priority: {e}")
+        return None
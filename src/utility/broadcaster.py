@@ -0,0 +1,144 @@
+"""Fire-and-forget in-game broadcasts sent from a background thread.
+
+Messages are queued and sent one by one over the rcon connection pool, at most one every
+`min_interval` seconds so chat isn't flooded. A message that's already queued, or was just sent, is
+dropped. While the server doesn't answer, queued messages are discarded instead of each one
+waiting for a timeout. Rcon packets are ascii, so other characters are transliterated or dropped.
+"""
+
+import collections
+import threading
+import time
+import unicodedata
+
+from loguru import logger
+
+from palworld_rcon.source_rcon import RconError, SourceRcon
+
+
+class BroadcastQueue:
+    def __init__(
+        self,
+        rcon: SourceRcon,
+        min_interval: float = 1.0,  # Seconds between broadcasts.
+        duplicate_window: float = 10.0,  # Drop a message identical to one sent this many seconds ago.
+        max_queued: int = 50,  # Oldest messages are dropped past this.
+        timeout: float = 3.0,  # Per broadcast rcon timeout.
+        retry_after: float = 15.0,  # Seconds to discard messages for after a failed broadcast.
+    ) -> None:
+        self.rcon = rcon
+        self.min_interval = min_interval
+        self.duplicate_window = duplicate_window
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.sent = 0
+        self.dropped = 0
+        self._queue = collections.deque(maxlen=max_queued)
+        self._recently_sent: dict[str, float] = {}  # message -> monotonic time sent
+        self._sending = False
+        self._last_sent_at = 0.0
+        self._down_until = 0.0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def put(self, message: str) -> None:
+        """Queues `message` and returns immediately."""
+        ascii_message = unicodedata.normalize("NFKD", message).encode("ascii", "ignore").decode("ascii")
+        if ascii_message != message:
+            logger.warning(f"Broadcast isn't ascii, sending it as: {ascii_message!r}")
+            message = ascii_message
+        if not message.strip():
+            self.dropped += 1
+            return
+
+        with self._condition:
+            if self._closed:
+                return
+            now = time.monotonic()
+            sent_at = self._recently_sent.get(message)
+            if message in self._queue or (
+                sent_at is not None and now - sent_at < self.duplicate_window
+            ):
+                self.dropped += 1
+                logger.debug(f"Dropping duplicate broadcast: {message}")
+                return
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(message)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="broadcaster", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Waits until every queued message was sent (or dropped). Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._queue or self._sending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Sends what's queued (up to `timeout` seconds) and stops the worker."""
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                # Rate limit, new messages can still be queued (and deduplicated) meanwhile.
+                wait = self._last_sent_at + self.min_interval - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                message = self._queue.popleft()
+                self._sending = True
+                server_down = time.monotonic() < self._down_until
+
+            try:
+                if server_down:
+                    self.dropped += 1
+                    logger.debug(f"Server not answering, dropping broadcast: {message}")
+                else:
+                    self._send(message)
+            except Exception as e:
+                # Anything that isn't an rcon error is a problem with this message, keep the worker
+                # alive for the next one.
+                self.dropped += 1
+                logger.error(f"Error while sending broadcast {message!r}: {e}")
+            finally:
+                with self._condition:
+                    self._sending = False
+                    self._condition.notify_all()
+
+    def _send(self, message: str) -> None:
+        try:
+            self.rcon.query("Broadcast", [message], timeout=self.timeout)
+        except RconError as e:
+            self.dropped += 1
+            logger.warning("Not able to send broadcast. Server online?")
+            logger.debug(f"Broadcast error: {e}")
+            with self._condition:
+                self._down_until = time.monotonic() + self.retry_after
+            return
+
+        now = time.monotonic()
+        with self._condition:
+            self.sent += 1
+            self._last_sent_at = now
+            self._recently_sent[message] = now
+            for old_message, sent_at in list(self._recently_sent.items()):
+                if now - sent_at >= self.duplicate_window:
+                    del self._recently_sent[old_message]
@@ -0,0 +1,91 @@
+"""Per-file sha256 manifests for backups, hashed in parallel.
+
+hashlib releases the GIL while it hashes, so a thread pool hashes several files at once on all cores.
+A manifest maps each file's path (relative to the backed up folder) to its size and sha256, and is
+checked before a backup is restored.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BackupVerificationError(Exception):
+    def __init__(self, message: str, problems: list) -> None:
+        super().__init__(f"{message}: {'; '.join(problems[:10])}{' ...' if len(problems) > 10 else ''}")
+        self.problems = problems
+
+
+def hash_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def hash_files(paths: list, workers: int = None) -> list:
+    """sha256 of every path, in order, hashed in parallel. None for files that can't be read."""
+
+    def hash_or_none(path) -> str:
+        try:
+            return hash_file(path)
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count(), thread_name_prefix="hash") as executor:
+        return list(executor.map(hash_or_none, paths))
+
+
+def write_manifest(path: str, files: dict) -> str:
+    """Atomically writes a manifest of `files` and returns the manifest's own sha256."""
+    path = Path(path)
+    manifest_bytes = json.dumps({"created_at": time.time(), "files": files}).encode("utf-8")
+    temp_path = path.with_name(path.name + ".tmp")
+    with open(temp_path, "wb") as f:
+        f.write(manifest_bytes)
+    os.replace(temp_path, path)
+    return hashlib.sha256(manifest_bytes).hexdigest()
+
+
+def load_manifest(path: str) -> dict:
+    """The `files` of a manifest written by `write_manifest`."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+def verify_tree(root: str, files: dict, workers: int = None) -> list:
+    """Checks `root` against a manifest's `files`. Returns what's wrong, empty if it all matches."""
+    root = Path(root)
+    problems = []
+    to_hash = []
+    for relative_path, entry in files.items():
+        path = root / relative_path
+        try:
+            size = path.stat().st_size
+        except OSError:
+            problems.append(f"missing {relative_path}")
+            continue
+        if size != entry["size"]:
+            problems.append(f"{relative_path} is {size} bytes, expected {entry['size']}")
+            continue
+        to_hash.append((relative_path, path, entry["sha256"]))
+
+    digests = hash_files([path for _, path, _ in to_hash], workers)
+    for (relative_path, _, expected), digest in zip(to_hash, digests):
+        if digest != expected:
+            problems.append(f"checksum mismatch in {relative_path}")
+
+    for folder, _, filenames in os.walk(root):
+        for filename in filenames:
+            relative_path = (Path(folder) / filename).relative_to(root).as_posix()
+            if relative_path not in files:
+                problems.append(f"unexpected file {relative_path}")
+    return problems
@@ -0,0 +1,248 @@
+"""Fast folder copies for backups.
+
+Per file, the cheapest available method is used:
+* `FICLONE` reflink on copy-on-write filesystems (btrfs, xfs), which copies no data at all.
+* `os.copy_file_range` / `os.sendfile`, which copy inside the kernel.
+* A plain buffered read/write loop everywhere else (e.g. windows).
+
+Holes in sparse files are skipped with `SEEK_DATA` / `SEEK_HOLE` where supported, and files are
+copied in parallel on a thread pool (all of the above release the GIL).
+
+With `checksums`, files are sha256 hashed while they're copied (so the copy is read once instead of
+being re-read for a manifest). That needs the data in userspace, so only reflinks and the read/write
+loop are used then.
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+ZEROS = bytes(COPY_CHUNK_SIZE)
+
+
+@dataclass
+class CopyStats:
+    files: int = 0
+    bytes: int = 0
+    reflinked_files: int = 0
+    seconds: float = 0.0
+    file_hashes: dict = None  # {path relative to the source dir: {"size", "sha256"}} with `checksums`.
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second."""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+
+def _try_reflink(src_fd: int, dst_fd: int) -> bool:
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError:
+        return False
+
+
+def _data_ranges(fd: int, size: int):
+    """Yields (offset, length) of the data regions of a (possibly sparse) file."""
+    if not hasattr(os, "SEEK_DATA"):
+        yield 0, size
+        return
+    offset = 0
+    while offset < size:
+        try:
+            data_start = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError:  # ENXIO: only a hole left. Also raised if the filesystem doesn't support it.
+            if offset == 0:
+                yield 0, size
+            return
+        data_end = os.lseek(fd, data_start, os.SEEK_HOLE)
+        yield data_start, data_end - data_start
+        offset = data_end
+
+
+def _copy_range(src_fd: int, dst_fd: int, offset: int, length: int, progress: callable = None) -> None:
+    end = offset + length
+    if hasattr(os, "copy_file_range"):
+        try:
+            while offset < end:
+                copied = os.copy_file_range(
+                    src_fd, dst_fd, min(COPY_CHUNK_SIZE, end - offset), offset, offset
+                )
+                if not copied:
+                    break
+                offset += copied
+                if progress:
+                    progress(copied)
+            if offset >= end:
+                return
+        except OSError:  # EXDEV on old kernels, ENOSYS, EINVAL on some filesystems.
+            pass
+
+    if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+        try:
+            os.lseek(dst_fd, offset, os.SEEK_SET)
+            while offset < end:
+                sent = os.sendfile(dst_fd, src_fd, offset, min(COPY_CHUNK_SIZE, end - offset))
+                if not sent:
+                    break
+                offset += sent
+                if progress:
+                    progress(sent)
+            if offset >= end:
+                return
+        except OSError:
+            pass
+
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while offset < end:
+        chunk = os.read(src_fd, min(COPY_CHUNK_SIZE, end - offset))
+        if not chunk:
+            break
+        os.write(dst_fd, chunk)
+        offset += len(chunk)
+        if progress:
+            progress(len(chunk))
+
+
+def _hash_zeros(hasher, length: int) -> None:
+    """Hashes the zeros of a hole that wasn't copied."""
+    while length > 0:
+        hasher.update(ZEROS[: min(COPY_CHUNK_SIZE, length)])
+        length -= COPY_CHUNK_SIZE
+
+
+def _copy_range_hashed(
+    src_fd: int, dst_fd: int, offset: int, length: int, hasher, progress: callable = None
+) -> int:
+    """Read/write loop of `_copy_range` that also hashes the data. Returns where it stopped."""
+    end = offset + length
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while offset < end:
+        chunk = os.read(src_fd, min(COPY_CHUNK_SIZE, end - offset))
+        if not chunk:
+            break
+        os.write(dst_fd, chunk)
+        hasher.update(chunk)
+        offset += len(chunk)
+        if progress:
+            progress(len(chunk))
+    return offset
+
+
+def copy_file(src: Path, dst: Path, progress: callable = None, hasher=None) -> bool:
+    """Copies one file with its metadata. Returns True if it was reflinked.
+
+    `progress` is called with the number of bytes copied after every chunk and may raise to abort.
+    If a `hashlib` `hasher` is given, it's updated with the copied file's contents.
+    """
+    binary_flag = getattr(os, "O_BINARY", 0)
+    src_fd = os.open(src, os.O_RDONLY | binary_flag)
+    try:
+        size = os.fstat(src_fd).st_size
+        dst_mode = os.O_RDWR if hasher else os.O_WRONLY
+        dst_fd = os.open(dst, dst_mode | os.O_CREAT | os.O_TRUNC | binary_flag, 0o666)
+        try:
+            reflinked = _try_reflink(src_fd, dst_fd)
+            if reflinked:
+                if progress:
+                    progress(size)
+                if hasher:
+                    # No data went through us, read the clone once.
+                    os.lseek(dst_fd, 0, os.SEEK_SET)
+                    while chunk := os.read(dst_fd, COPY_CHUNK_SIZE):
+                        hasher.update(chunk)
+            elif hasher:
+                hashed = 0
+                for offset, length in _data_ranges(src_fd, size):
+                    _hash_zeros(hasher, offset - hashed)
+                    hashed = _copy_range_hashed(
+                        src_fd, dst_fd, offset, min(length, size - offset), hasher, progress
+                    )
+                _hash_zeros(hasher, size - hashed)
+                os.ftruncate(dst_fd, size)
+            else:
+                for offset, length in _data_ranges(src_fd, size):
+                    _copy_range(src_fd, dst_fd, offset, length, progress)
+                # Sets the size if the file ends in a hole.
+                os.ftruncate(dst_fd, size)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    shutil.copystat(src, dst)
+    return reflinked
+
+
+def copy_tree(
+    source_dir: str,
+    destination_dir: str,
+    workers: int = None,
+    progress: callable = None,  # See `copy_file`. Called from the copying threads.
+    checksums: bool = False,  # Fill `CopyStats.file_hashes` with the sha256 of every copied file.
+) -> CopyStats:
+    """Copies `source_dir` to the new folder `destination_dir`, like `shutil.copytree`."""
+    source_dir = Path(source_dir)
+    destination_dir = Path(destination_dir)
+    workers = workers or min(8, (os.cpu_count() or 1) * 2)
+
+    start_time = time.perf_counter()
+    stats = CopyStats(file_hashes={} if checksums else None)
+    files = []
+    for root, dirnames, filenames in os.walk(source_dir):
+        root = Path(root)
+        target_root = destination_dir / root.relative_to(source_dir)
+        target_root.mkdir(parents=True, exist_ok=root != source_dir)
+        for filename in filenames:
+            files.append((root / filename, target_root / filename))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="copy") as executor:
+        hashers = [hashlib.sha256() if checksums else None for _ in files]
+        futures = [
+            executor.submit(copy_file, src, dst, progress, hasher)
+            for (src, dst), hasher in zip(files, hashers)
+        ]
+        try:
+            for (src, dst), hasher, future in zip(files, hashers, futures):
+                stats.reflinked_files += future.result()
+                stats.files += 1
+                stats.bytes += src.stat().st_size
+                if checksums:
+                    stats.file_hashes[dst.relative_to(destination_dir).as_posix()] = {
+                        "size": dst.stat().st_size,
+                        "sha256": hasher.hexdigest(),
+                    }
+        except BaseException:
+            # Don't start the files that are still queued.
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+
+    # Directory timestamps last, copying files into them updates their mtime.
+    for root, _, _ in os.walk(source_dir):
+        shutil.copystat(root, destination_dir / Path(root).relative_to(source_dir))
+
+    stats.seconds = time.perf_counter() - start_time
+    logger.info(
+        f"Copied {stats.files} files ({stats.bytes} bytes, {stats.reflinked_files} reflinked) "
+        f"in {stats.seconds:.2f}s ({stats.throughput / 1024 / 1024:.1f} MiB/s)."
+    )
+    return stats
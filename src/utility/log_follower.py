@@ -0,0 +1,173 @@
+"""Follows the server log file and turns interesting lines into events.
+
+Only bytes appended since the last poll are read. The read offset (and the file's identity) can be
+saved to a state file, so restarting the watcher neither re-reads nor skips lines. When the server
+rotates the log (renames it and starts a new one) or truncates it, following restarts at the
+beginning of the new file. The file isn't kept open between polls, which windows needs for the
+server to be able to rotate it.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from loguru import logger
+
+
+# (event kind, pattern). The first match wins, named groups end up in `LogEvent.data`.
+DEFAULT_PATTERNS = [
+    ("crash", re.compile(r"Unhandled Exception|Critical error|Segmentation fault|SIGSEGV|Assertion failed")),
+    ("fatal", re.compile(r"\bFatal\b|LogCore: Error:", re.IGNORECASE)),
+    ("player_connected", re.compile(r"\[LOG\] (?P<name>.+?) joined the server")),
+    ("player_disconnected", re.compile(r"\[LOG\] (?P<name>.+?) left the server")),
+    ("save_completed", re.compile(r"Complete Save|World save(?:d| complete)", re.IGNORECASE)),
+    ("hitch", re.compile(r"[Hh]itch.*?(?P<ms>\d+(?:\.\d+)?)\s*ms")),
+]
+MAX_READ_BYTES = 4 * 1024 * 1024  # Per poll, so a huge backlog can't stall the caller.
+
+
+@dataclass
+class LogEvent:
+    kind: str
+    line: str
+    timestamp: float  # Unix timestamp the line was read at.
+    data: dict = field(default_factory=dict)
+
+
+class LogFollower:
+    def __init__(
+        self,
+        path: str,  # Log file, e.g. Pal/Saved/Logs/Pal.log
+        patterns: list = None,  # [(kind, compiled regex)], `DEFAULT_PATTERNS` if not provided.
+        state_file: str = None,  # Keeps the read offset across watcher restarts.
+        start_at_end: bool = True,  # Without a saved offset, skip what's already in the file.
+    ) -> None:
+        self.path = Path(path)
+        self.patterns = DEFAULT_PATTERNS if patterns is None else patterns
+        self.state_file = Path(state_file) if state_file else None
+        self.start_at_end = start_at_end
+        self._file_id = None  # (st_dev, st_ino) of the file being followed.
+        self._offset = 0  # Bytes of the file consumed, including `_partial`.
+        self._partial = b""  # Unterminated last line.
+        self._listeners = []
+        self._thread = None
+        self._stop = threading.Event()
+        self._load_state()
+
+    def _load_state(self) -> None:
+        if not self.state_file or not self.state_file.exists():
+            return
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                state = json.load(f)
+            if state["path"] == str(self.path):
+                self._file_id = tuple(state["file_id"])
+                self._offset = state["offset"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable log follower state {self.state_file}: {e}")
+
+    def _save_state(self) -> None:
+        if not self.state_file:
+            return
+        state = {
+            "path": str(self.path),
+            "file_id": self._file_id,
+            "offset": self._offset - len(self._partial),
+        }
+        temp_path = self.state_file.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_file)
+
+    def add_listener(self, callback: callable) -> None:
+        """`callback(event)` is called for every event, from the follower thread if `start`ed."""
+        self._listeners.append(callback)
+
+    def poll(self) -> list:
+        """Reads whatever was appended since the last poll and returns its events."""
+        try:
+            file_stat = os.stat(self.path)
+        except FileNotFoundError:
+            if self._file_id is None:
+                self.start_at_end = False  # Nothing to skip, a file created later is read from the start.
+            return []
+
+        file_id = (file_stat.st_dev, file_stat.st_ino)
+        if file_id != self._file_id:
+            if self._file_id is None and self.start_at_end:
+                self._offset = file_stat.st_size
+            else:
+                if self._file_id is not None:
+                    logger.debug(f"Log file {self.path} was rotated, following the new one.")
+                self._offset = 0
+            self._file_id = file_id
+            self._partial = b""
+        elif file_stat.st_size < self._offset:
+            logger.debug(f"Log file {self.path} was truncated, reading from the start.")
+            self._offset = 0
+            self._partial = b""
+
+        if file_stat.st_size == self._offset:
+            return []
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(MAX_READ_BYTES)
+        self._offset += len(data)
+
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        events = []
+        now = time.time()
+        for raw_line in lines:
+            line = raw_line.decode("utf-8", errors="replace").lstrip("\ufeff").rstrip("\r")
+            event = self.match(line, now)
+            if event:
+                events.append(event)
+        self._save_state()
+
+        for event in events:
+            for callback in self._listeners:
+                try:
+                    callback(event)
+                except Exception:
+                    logger.exception(f"Log event listener failed for {event.kind}.")
+        return events
+
+    def match(self, line: str, timestamp: float = None) -> LogEvent:
+        for kind, pattern in self.patterns:
+            found = pattern.search(line)
+            if found:
+                return LogEvent(
+                    kind,
+                    line,
+                    time.time() if timestamp is None else timestamp,
+                    {key: value for key, value in found.groupdict().items() if value is not None},
+                )
+        return None
+
+    def start(self, interval: float = 0.5) -> None:
+        """Polls every `interval` seconds on a daemon thread until `stop()`."""
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.poll()
+                except OSError as e:
+                    logger.debug(f"Couldn't read log file {self.path}: {e}")
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name="log_follower", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
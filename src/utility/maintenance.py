@@ -0,0 +1,35 @@
+"""Player-aware timing for restarts and other heavy maintenance."""
+
+import time
+
+from dataclasses import dataclass
+
+
+@dataclass
+class MaintenancePolicy:
+    """Moves maintenance into low-traffic periods based on the online player count.
+
+    A player count of None means it's unknown (e.g. the server didn't answer), in which case nothing
+    is deferred or run early.
+    """
+
+    restart_max_players: int = 0  # Due restarts wait until at most this many players are online.
+    restart_max_delay_seconds: float = 3600  # Restart anyway once a due restart waited this long.
+    idle_max_players: int = 0  # The server counts as idle with at most this many players online.
+    run_early_after: float = 0.5  # When idle, run jobs once this fraction of their interval has passed. -1 to disable.
+
+    def should_defer_restart(self, player_count: int, due_since: float, now: float = None) -> bool:
+        """True if a restart that's been due since `due_since` should wait for fewer players."""
+        now = time.time() if now is None else now
+        if player_count is None or player_count <= self.restart_max_players:
+            return False
+        return now - due_since < self.restart_max_delay_seconds
+
+    def is_idle(self, player_count: int) -> bool:
+        return player_count is not None and player_count <= self.idle_max_players
+
+    def should_run_early(self, interval: float, seconds_until_due: float, player_count: int) -> bool:
+        """True if a periodic job due in `seconds_until_due` should run now because the server is idle."""
+        if self.run_early_after < 0 or not self.is_idle(player_count):
+            return False
+        return interval - seconds_until_due >= interval * self.run_early_after
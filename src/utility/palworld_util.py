@@ -1,18 +1,66 @@
-from palworld_rcon.source_rcon import SourceRcon
-from utility.util import check_for_process, kill_process
+from palworld_rcon.cached_rcon import CachedRcon
+from palworld_rcon.source_rcon import RconAuthError, RconConnectError, SourceRcon
+from utility.backup_archive import CODECS, create_archive, extract_archive
+from utility.backup_catalog import BackupCatalog, BackupRecord, RetentionPolicy
+from utility.backup_store import BackupStore
+from utility.backup_worker import BackupWorker
+from utility.copy_engine import copy_tree
+from utility.metrics import MetricsRegistry, MetricsServer
+from utility.broadcaster import BroadcastQueue
+from utility.checksums import (
+    BackupVerificationError,
+    hash_file,
+    hash_files,
+    load_manifest,
+    verify_tree,
+    write_manifest,
+)
+from utility.players import PlayerPoller
+from utility.process_tracker import ServerProcessTracker
+from utility.resource_sampler import ResourceSampler
+from utility.steam_update import SteamUpdateChecker
+from utility.util import (
+    PROCESS_PRIORITIES,
+    PhaseTimer,
+    backoff_delays,
+    set_process_scheduling,
+)
 
+import collections
 import datetime
+import json
 import os
 import shutil
 import socket
 import subprocess
+import threading
 import time
 
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
 
+import psutil
 from loguru import logger
 
 
+@dataclass
+class LaunchTimings:
+    """How long a server launch took, as unix timestamps."""
+
+    spawned_at: float
+    port_open_at: float = None
+    rcon_ready_at: float = None  # An authenticated `Info` round trip succeeded.
+
+    @property
+    def port_open_seconds(self) -> float:
+        return self.port_open_at - self.spawned_at if self.port_open_at else None
+
+    @property
+    def rcon_ready_seconds(self) -> float:
+        return self.rcon_ready_at - self.spawned_at if self.rcon_ready_at else None
+
+
 class PalworldUtil:
     def __init__(
         self,
@@ -31,9 +79,33 @@ class PalworldUtil:
         backup_dir: str = None,  # "$script_root/$backup_dir"
         rotate_backups: bool = True,  # Delete oldest backups
         rotate_after_x_backups: int = 5,  # Delete oldest backups after we have this many.
+        keep_hourly_backups: int = 0,  # Also keep the newest backup of each of the last x hours.
+        keep_daily_backups: int = 0,  # Also keep the newest backup of each of the last x days.
+        keep_weekly_backups: int = 0,  # Also keep the newest backup of each of the last x weeks.
+        backup_mode: str = "copy",  # "copy" for full folder copies, "incremental" for a deduplicating BackupStore or "archive" for compressed archives.
+        archive_codec: str = "gzip",  # Only used if `backup_mode = "archive"`. "gzip", "bz2", "xz" or "zstd" (needs `zstandard`).
+        archive_level: int = None,  # Compression level, codec default if not provided.
+        archive_workers: int = None,  # Processes compressing in parallel, defaults to cpu count.
+        copy_workers: int = None,  # Threads copying files in parallel when `backup_mode = "copy"`.
+        checksum_workers: int = None,  # Threads hashing files for backup checksum manifests / verification, defaults to cpu count.
+        backup_io_priority: str = "idle",  # I/O priority of background backups: "idle", "low" or "normal".
+        backup_bandwidth_limit: float = None,  # Max bytes per second background backups read, unlimited if not provided.
         operating_system: str = "windows",  # "windows" or "linux".
         terminal: str = "gnome-terminal",  # Only used if `operating_system = "linux"`
         public_server: bool = False,  # If True, add `-publiclobby` to launch args.
+        pidfile: str = None,  # Where launched server pids are saved. "$script_root/palserver_$server_port.pid" if not provided.
+        launch_metrics_file: str = None,  # If set, launch timings are appended here as json lines.
+        update_state_file: str = None,  # Latest build cache / last validate time. "$script_root/steam_update_$steam_app_id.json" if not provided.
+        latest_build_ttl: int = 300,  # Seconds to trust the last queried latest build id before asking steamcmd again.
+        validate_every_x_hours: int = 168,  # Full steamcmd validate schedule. -1 to only validate after detected corruption.
+        player_history_file: str = None,  # If set, finished player sessions are appended here as json lines.
+        rcon_cache_ttls: dict = None,  # Seconds to cache read-only rcon commands for, e.g. {"Info": 60, "ShowPlayers": 5}. {} to disable.
+        broadcast_interval: float = 1.0,  # Minimum seconds between in-game broadcasts.
+        resource_history_samples: int = 2880,  # Server resource samples kept, e.g. a day of samples taken every 30 seconds.
+        force_install_dir: bool = False,  # Install / update the server into `palword_server_dir` (steamcmd +force_install_dir), e.g. one install per instance.
+        steamcmd_lock: threading.Lock = None,  # Share between instances using the same steamcmd so it never runs twice at once.
+        cpu_affinity: list = None,  # Cores to pin the server process to, e.g. [0, 1, 2, 3]. All cores if not provided.
+        process_priority: str = None,  # Server process priority set on launch: "idle", "below_normal", "normal", "above_normal" or "high".
     ) -> None:
         self.steamcmd_dir = Path(steamcmd_dir)
         self.server_name = server_name
@@ -90,6 +162,46 @@ class PalworldUtil:
         # Overwrite palworld_server_dir if set by user
         if palword_server_dir:
             self.palworld_server_dir = palword_server_dir
+        self.force_install_dir = force_install_dir
+        self.steamcmd_lock = steamcmd_lock or threading.Lock()
+
+        if process_priority is not None and process_priority not in PROCESS_PRIORITIES:
+            raise ValueError(
+                f"Unknown process priority {process_priority!r}, use one of {list(PROCESS_PRIORITIES)}"
+            )
+        self.cpu_affinity = cpu_affinity
+        self.process_priority = process_priority
+
+        # Track launched server processes by pid.
+        if pidfile is None:
+            pidfile = Path(os.getcwd()) / f"palserver_{self.server_port}.pid"
+        self.process_tracker = ServerProcessTracker(pidfile, self.palworld_server_dir)
+        self.resource_sampler = ResourceSampler(self.process_tracker, resource_history_samples)
+        self.launch_metrics_file = launch_metrics_file
+
+        # Only run steamcmd when the installed build is outdated (or a validate is due).
+        if update_state_file is None:
+            update_state_file = Path(os.getcwd()) / f"steam_update_{self.steam_app_id}.json"
+        self.update_checker = SteamUpdateChecker(
+            self.steamcmd_dir,
+            self.steamcmd_executable,
+            self.steam_app_id,
+            self.palworld_server_dir,
+            update_state_file,
+            latest_build_ttl=latest_build_ttl,
+            validate_every_x_hours=validate_every_x_hours,
+            shell=not self.start_new_session,
+            manifest_path=(
+                Path(self.palworld_server_dir) / "steamapps" / f"appmanifest_{self.steam_app_id}.acf"
+                if force_install_dir
+                else None
+            ),
+            lock=self.steamcmd_lock,
+        )
+        self.launch_history = collections.deque(maxlen=50)  # Recent `LaunchTimings`, newest last.
+        self.last_restart_phases: dict[str, float] = {}  # Seconds per phase of the last `restart_server`.
+        self.last_restore_phases: dict[str, float] = {}  # Seconds per phase of the last `restore_backup`.
+        self.last_launch_at: float = None  # Unix timestamp of the last `launch_server` spawn.
 
         # Set path to Palworld server saves
         self.palworld_server_save_dir = Path(self.palworld_server_dir / "Pal" / "Saved")
@@ -99,10 +211,16 @@ class PalworldUtil:
         self.server_launch_args.append("-NoAsyncLoadingThread")
         self.server_launch_args.append("-UseMultithreadForDS")
 
-        if rcon:
-            self.rcon = rcon
-        else:
-            self.rcon = SourceRcon(self.server_ip, self.rcon_port, self.rcon_password)
+        if not rcon:
+            rcon = SourceRcon(self.server_ip, self.rcon_port, self.rcon_password)
+        # Concurrent Info / ShowPlayers calls share one request and are cached briefly.
+        self.rcon = CachedRcon(rcon, rcon_cache_ttls)
+
+        # Broadcasts are sent from a background queue so callers never wait on rcon.
+        self.broadcaster = BroadcastQueue(self.rcon, min_interval=broadcast_interval)
+
+        # Shared ShowPlayers snapshot with join/leave diffs.
+        self.player_poller = PlayerPoller(self.rcon, player_history_file)
 
         # Create and use "$script_root/backups" dir if backups_dir isn't provided.
         if backup_dir is None:
@@ -114,8 +232,123 @@ class PalworldUtil:
 
         self.rotate_backups = rotate_backups
         self.rotate_after_x_backups = rotate_after_x_backups
+        self.keep_hourly_backups = keep_hourly_backups
+        self.keep_daily_backups = keep_daily_backups
+        self.keep_weekly_backups = keep_weekly_backups
+
+        self.backup_mode = backup_mode.lower()
+        self._backup_store = None
+        self._backup_catalog = None
+        self.archive_codec = archive_codec
+        self.archive_level = archive_level
+        self.archive_workers = archive_workers
+        self.copy_workers = copy_workers
+        self.checksum_workers = checksum_workers
+        # Background backups, so the watcher keeps responding while one runs.
+        self.backup_worker = BackupWorker(self, backup_io_priority, backup_bandwidth_limit)
+
+        self.metrics = MetricsRegistry()
+        self.metrics_server: MetricsServer = None
+        self._init_metrics()
+
+    def _init_metrics(self):
+        metrics = self.metrics
+        self._rcon_seconds = metrics.histogram(
+            "palworld_rcon_command_seconds", "Rcon command round trip time.", ("command",)
+        )
+        self._rcon_errors = metrics.counter(
+            "palworld_rcon_command_errors_total", "Failed rcon commands.", ("command",)
+        )
+        self._rcon_connect_failures = metrics.counter(
+            "palworld_rcon_connect_failures_total", "Failed rcon connection attempts."
+        )
+        self._rcon_auth_failures = metrics.counter(
+            "palworld_rcon_auth_failures_total", "Rejected rcon authentications."
+        )
+        self.rcon.observers.append(self._observe_rcon_command)
+
+        self._backup_seconds = metrics.histogram(
+            "palworld_backup_seconds",
+            "Time taken by backups.",
+            ("mode",),
+            buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800),
+        )
+        self._backup_bytes = metrics.gauge(
+            "palworld_backup_bytes", "Size of the last backup.", ("mode",)
+        )
+        self._backups = metrics.counter(
+            "palworld_backups_total", "Backups taken.", ("mode", "trigger")
+        )
+        metrics.gauge(
+            "palworld_backup_progress_ratio", "Progress of the running background backup, 0 to 1."
+        ).set_function(
+            lambda: self.backup_worker.current.progress.fraction if self.backup_worker.busy else None
+        )
+        self._restart_phase_seconds = metrics.gauge(
+            "palworld_restart_phase_seconds", "Seconds per phase of the last restart.", ("phase",)
+        )
+        self._restarts = metrics.counter("palworld_restarts_total", "Server restarts.")
+        self._restores = metrics.counter("palworld_backup_restores_total", "Backups restored.")
+        self._launch_ready_seconds = metrics.gauge(
+            "palworld_launch_rcon_ready_seconds", "Seconds from spawn to rcon ready on the last launch."
+        )
+
+        def server_uptime():
+            tracked = self.process_tracker.server or self.process_tracker.launcher
+            process = tracked.get() if tracked else None
+            return time.time() - process.create_time() if process else None
+
+        metrics.gauge(
+            "palworld_server_uptime_seconds", "Uptime of the tracked server process."
+        ).set_function(server_uptime)
+        for name, field, documentation in (
+            ("palworld_server_rss_bytes", "rss", "Resident memory of the server at the last sample."),
+            ("palworld_server_cpu_percent", "cpu_percent", "Server cpu use at the last sample, 100 per core."),
+            ("palworld_server_threads", "threads", "Server thread count at the last sample."),
+        ):
+            metrics.gauge(name, documentation).set_function(
+                lambda field=field: getattr(self.resource_sampler.history.latest(), field, None)
+            )
+        metrics.gauge(
+            "palworld_players_online", "Players online at the last poll."
+        ).set_function(
+            lambda: len(self.player_poller.players) if self.player_poller.polled_at else None
+        )
+
+    def _observe_rcon_command(self, command: str, seconds: float, error: Exception):
+        if error is None:
+            self._rcon_seconds.observe(seconds, command=command)
+            return
+        self._rcon_errors.inc(command=command)
+        if isinstance(error, RconConnectError):
+            self._rcon_connect_failures.inc()
+        elif isinstance(error, RconAuthError):
+            self._rcon_auth_failures.inc()
+
+    def start_metrics_server(self, host: str = "127.0.0.1", port: int = 9877) -> MetricsServer:
+        """Serves Prometheus-style metrics on http://host:port/metrics."""
+        self.metrics_server = MetricsServer(self.metrics, host, port).start()
+        return self.metrics_server
+
+    @property
+    def backup_store(self) -> BackupStore:
+        """Deduplicating store used when `backup_mode = "incremental"`, kept in `$backups_dir/store`."""
+        if self._backup_store is None:
+            self._backup_store = BackupStore(Path(self.backups_dir) / "store")
+        return self._backup_store
+
+    @property
+    def backup_catalog(self) -> BackupCatalog:
+        """Catalog of every backup taken, kept in `$backups_dir/catalog.sqlite3`. Drives rotation."""
+        if self._backup_catalog is None:
+            Path(self.backups_dir).mkdir(parents=True, exist_ok=True)
+            self._backup_catalog = BackupCatalog(Path(self.backups_dir) / "catalog.sqlite3")
+            if self._backup_catalog.is_new:
+                self._import_existing_backups()
+        return self._backup_catalog
 
     def log_and_broadcast(self, message: str, log_level: str = "info"):
+        """Logs `message` right away and queues it as an in-game broadcast."""
         match log_level.lower():
             case "info":
                 logger.info(message)
@@ -129,13 +362,15 @@ class PalworldUtil:
                 logger.exception(message)
             case "success":
                 logger.success(message)
-        try:
-            self.rcon.send_command("Broadcast", [message])
-        except OSError as e:
-            logger.warning(
-                f"Not able to send broadcast via log_and_broadcast(). Server online?"
-            )
-            logger.debug(f"log_and_broadcast() error: {e}")
+        self.broadcaster.put(message)
+
+    def get_players(self) -> dict:
+        """Polls `ShowPlayers` and returns the online players as {steamid / playeruid: Player}.
+
+        Returns the last known players if the server couldn't be reached.
+        """
+        self.player_poller.poll()
+        return self.player_poller.players
 
     def save_server_state(self) -> bool:
         """Tries to send an rcon command to save the server / game state.
@@ -153,89 +388,574 @@ class PalworldUtil:
             self.log_and_broadcast("Save game state failed!")
             return False
 
-    def update_game_server(self):
-        """Calls steamcmd process on steam_app_id to get game / server updates."""
+    def update_game_server(
+        self,
+        force: bool = False,
+        force_validate: bool = False,
+        repairs_only: bool = False,  # Only run steamcmd if the install looks broken, see `SteamUpdateChecker.plan`.
+    ) -> bool:
+        """Calls steamcmd process on steam_app_id to get game / server updates.
+
+        Skips steamcmd if the installed build is already the latest, and only adds `validate`
+        when it's due or the install looks corrupt (see `SteamUpdateChecker`).
+        Returns True if steamcmd ran.
+        """
         logger.info("Checking for game server updates...")
-        subprocess.call(
-            [
-                self.steamcmd_executable,
-                "+login",
-                "anonymous",
-                "+app_update",
-                self.steam_app_id,
-                "validate",
-                "+quit",
-            ],
-            cwd=self.steamcmd_dir,
-            start_new_session=self.start_new_session,
-            shell=not self.start_new_session,
+        action, reason = self.update_checker.plan(force_validate=force_validate, repairs_only=repairs_only)
+        if action == "skip" and not force:
+            logger.info(f"Skipping steamcmd, {reason}.")
+            return False
+
+        validate = action == "validate"
+        logger.info(f"Running steamcmd{' with validate' if validate else ''}: {reason}.")
+        steamcmd_args = [self.steamcmd_executable]
+        if self.force_install_dir:
+            # Has to come before +login.
+            steamcmd_args += ["+force_install_dir", str(Path(self.palworld_server_dir).resolve())]
+        steamcmd_args += [
+            "+login",
+            "anonymous",
+            "+app_update",
+            self.steam_app_id,
+        ]
+        if validate:
+            steamcmd_args.append("validate")
+        steamcmd_args.append("+quit")
+
+        start_time = time.perf_counter()
+        with self.steamcmd_lock:
+            return_code = subprocess.call(
+                steamcmd_args,
+                cwd=self.steamcmd_dir,
+                start_new_session=self.start_new_session,
+                shell=not self.start_new_session,
+            )
+        if return_code == 0:
+            self.update_checker.record_run(validated=validate)
+        else:
+            logger.warning(f"steamcmd exited with code {return_code}.")
+        logger.info(
+            f"steamcmd finished in {time.perf_counter() - start_time:.1f}s, "
+            f"installed build: {self.update_checker.installed_build_id()}"
         )
+        return True
 
-    def wait_for_rcon_port(self, timeout_secs: int = 10):
-        """Waits until success or timeout for connection to rcon."""
-        CONNECTION_SUCCESS_CODE = 0
-        start_time = time.time()
+    def wait_for_rcon_port(self, timeout_secs: int = 10) -> bool:
+        """Waits until success or timeout for a tcp connection to the rcon port.
+
+        Every attempt uses a fresh socket, retried with exponential backoff and jitter.
+        """
+        deadline = time.monotonic() + timeout_secs
         logger.debug(f"Waiting for RCON port ({self.rcon_port}) to be available...")
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            while time.time() - start_time < timeout_secs:
-                result = s.connect_ex((self.server_ip, self.rcon_port))
-                if result == CONNECTION_SUCCESS_CODE:
+        for delay in backoff_delays():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                with socket.create_connection(
+                    (self.server_ip, self.rcon_port), timeout=min(remaining, 2)
+                ):
                     logger.debug(f"Rcon port ({self.rcon_port}) ready for connections.")
                     return True
-                else:
-                    time.sleep(1)
+            except OSError:
+                time.sleep(min(delay, max(0, deadline - time.monotonic())))
         logger.warning("Timed out while waiting for rcon port.")
         return False
 
+    def wait_for_rcon_ready(self, timeout_secs: int = 10) -> bool:
+        """Waits until the server answers an authenticated `Info` over rcon, with backoff."""
+        deadline = time.monotonic() + timeout_secs
+        for delay in backoff_delays():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                response = self.rcon.query("Info", timeout=min(remaining, 5))
+                logger.debug(f"Rcon ready: {response.strip()}")
+                return True
+            except OSError as e:
+                logger.debug(f"Rcon not ready yet: {e}")
+                time.sleep(min(delay, max(0, deadline - time.monotonic())))
+        logger.warning("Timed out while waiting for rcon to respond.")
+        return False
+
+    def probe_server_ready(self, spawned_at: float, timeout_secs: int = 10) -> LaunchTimings:
+        """Waits for the rcon port, then for an rcon round trip, recording when each happened."""
+        timings = LaunchTimings(spawned_at=spawned_at)
+        deadline = time.monotonic() + timeout_secs
+
+        if self.wait_for_rcon_port(timeout_secs=timeout_secs):
+            timings.port_open_at = time.time()
+            if self.wait_for_rcon_ready(timeout_secs=deadline - time.monotonic()):
+                timings.rcon_ready_at = time.time()
+
+        self._record_launch(timings)
+        return timings
+
+    def _record_launch(self, timings: LaunchTimings):
+        self.launch_history.append(timings)
+        if timings.rcon_ready_seconds is not None:
+            self._launch_ready_seconds.set(timings.rcon_ready_seconds)
+
+        def describe(seconds: float) -> str:
+            return "never" if seconds is None else f"{seconds:.1f}s"
+
+        logger.info(
+            f"Launch timings: port open after {describe(timings.port_open_seconds)}, "
+            f"rcon ready after {describe(timings.rcon_ready_seconds)}."
+        )
+        if self.launch_metrics_file:
+            with open(self.launch_metrics_file, "a", encoding="utf-8") as f:
+                f.write(
+                    json.dumps(
+                        {
+                            **asdict(timings),
+                            "port_open_seconds": timings.port_open_seconds,
+                            "rcon_ready_seconds": timings.rcon_ready_seconds,
+                        }
+                    )
+                    + "\n"
+                )
+
     def launch_server(
         self,
         update_server: bool = True,
         wait_for_rcon_port: bool = False,
         wait_for_rcon_port_timeout: int = 10,
+        repairs_only: bool = False,  # Only run steamcmd if the install looks broken, e.g. to relaunch a crashed server fast.
     ) -> bool:
-        """Launches Palserver with specified parameters."""
+        """Launches Palserver with specified parameters.
+
+        With `wait_for_rcon_port`, waits until rcon answers and returns whether it did in time.
+        """
         # Check for server updates before launching.
         if update_server:
-            self.update_game_server()
+            self.update_game_server(repairs_only=repairs_only)
         else:
             logger.info("Skipping game server updates.")
 
         logger.info(
             f"Launching {self.palserver_executable} : {self.server_launch_args}..."
         )
-        subprocess.Popen(
+        self.rcon.invalidate()  # Don't answer readiness probes with the old server's responses.
+        spawn_time = self.last_launch_at = time.time()
+        launcher = subprocess.Popen(
             self.server_launch_args,
             cwd=self.palworld_server_dir,
             start_new_session=self.start_new_session,
             shell=not self.start_new_session,
         )
+        self.process_tracker.track_launch(launcher.pid, spawn_time, popen=launcher)
+        self.apply_process_scheduling()
 
         if wait_for_rcon_port:
-            self.wait_for_rcon_port(timeout_secs=wait_for_rcon_port_timeout)
+            timings = self.probe_server_ready(
+                spawn_time, timeout_secs=wait_for_rcon_port_timeout
+            )
+            return timings.rcon_ready_at is not None
+        return True
+
+    def apply_process_scheduling(self) -> None:
+        """Applies `cpu_affinity` and `process_priority` to the tracked server processes."""
+        if self.cpu_affinity is None and self.process_priority is None:
+            return
+        if self.process_tracker.server is None or self.process_tracker.server.get() is None:
+            logger.warning(
+                "No running server process is tracked, cpu affinity / priority only apply to the launcher (if any)."
+            )
+        done = set()
+        for tracked in (self.process_tracker.server, self.process_tracker.launcher):
+            process = tracked.get() if tracked else None
+            if process is None or process.pid in done:
+                continue  # The launcher may have exec'd into the server.
+            done.add(process.pid)
+            try:
+                set_process_scheduling(process, self.cpu_affinity, self.process_priority)
+                logger.info(
+                    f"Set {tracked.name} (pid {tracked.pid}) cpu affinity: {self.cpu_affinity or 'all'}, "
+                    f"priority: {self.process_priority or 'unchanged'}."
+                )
+            except (psutil.Error, OSError, ValueError, AttributeError) as e:
+                logger.warning(f"Couldn't set cpu affinity / priority of {tracked.name} (pid {tracked.pid}): {e}")
+
+    def is_server_running(self) -> bool:
+        """Checks the tracked server pid, falls back to a process scan of this install if nothing is tracked."""
+        if self.process_tracker.server is not None:
+            return self.process_tracker.is_running()
+        return bool(self.process_tracker.find_processes(self.palworld_server_proc_name))
+
+    def stop_server(self, timeout_secs: int = 30) -> bool:
+        """Gracefully stops the tracked server, force killing it after `timeout_secs`.
+
+        Falls back to killing this install's server processes by name if nothing is tracked. Returns True if a server was running.
+        """
+        # Let players see any pending warnings before the server goes away.
+        self.broadcaster.flush(timeout=5)
+        if self.process_tracker.server is not None:
+            stopped = self.process_tracker.stop(timeout=timeout_secs)
+        else:
+            # Only servers run out of this install, other instances on the host keep running.
+            stopped = False
+            for process in self.process_tracker.find_processes(self.palworld_server_proc_name):
+                try:
+                    process.kill()
+                    stopped = True
+                except psutil.NoSuchProcess:
+                    pass
+        # Close the sessions of everyone who was online.
+        self.rcon.invalidate()
+        self.player_poller.clear()
+        return stopped
+
+    def take_server_backup(
+        self,
+        timestamp_format: str = "%Y%m%d_%H%M%S",
+        trigger: str = "manual",
+        source_dir: str = None,
+        progress: callable = None,
+    ) -> BackupRecord:
+        """Backs up the server save dir using `backup_mode` and records it in the backup catalog.
+
+        `trigger` is stored with the backup, e.g. "timer", "restart" or "manual".
+        `source_dir` backs up a copy of the save dir (e.g. a snapshot) instead of the live one.
+        `progress` is called with the bytes backed up after every chunk and may raise to abort the
+        backup (see `BackupProgress`). Use `backup_worker` to back up in the background.
+        """
+        source_dir = Path(source_dir or self.palworld_server_save_dir)
+        # Open the catalog first so a one-time import doesn't pick up the backup we're about to take.
+        catalog = self.backup_catalog
 
-    def take_server_backup(self, timestamp_format: str = "%Y%m%d_%H%M%S"):
+        start_time = time.perf_counter()
         timestamp = datetime.datetime.now().strftime(timestamp_format)
-        destination_folder = os.path.join(
-            self.backups_dir,
-            os.path.basename(self.palworld_server_save_dir) + "_" + timestamp,
+        backup_name = os.path.basename(self.palworld_server_save_dir) + "_" + timestamp
+        record = BackupRecord(
+            name=backup_name, mode=self.backup_mode, path=None, trigger=trigger
         )
 
-        logger.info(f"Copying: {self.palworld_server_save_dir} -> {destination_folder}")
-        shutil.copytree(self.palworld_server_save_dir, destination_folder)
+        if self.backup_mode == "incremental":
+            logger.info(f"Snapshotting: {source_dir} -> {backup_name}")
+            stats = self.backup_store.snapshot(source_dir, backup_name, progress=progress)
+            record.path = str(self.backup_store.manifest_path(backup_name))
+            record.size = stats.bytes
+            record.file_count = stats.files
+            record.checksum = stats.checksum
+        elif self.backup_mode == "archive":
+            destination = os.path.join(self.backups_dir, backup_name)
+            logger.info(f"Archiving: {source_dir} -> {destination}")
+            stats = create_archive(
+                source_dir,
+                destination,
+                codec=self.archive_codec,
+                level=self.archive_level,
+                workers=self.archive_workers,
+                progress=progress,
+            )
+            write_manifest(self._checksums_path(stats.path), stats.file_hashes)
+            record.path = str(stats.path)
+            record.size = stats.output_bytes
+            record.file_count = stats.files
+            record.checksum = stats.sha256
+        else:
+            destination_folder = os.path.join(self.backups_dir, backup_name)
+            logger.info(
+                f"Copying: {source_dir} -> {destination_folder}"
+            )
+            try:
+                # Hash the data as it's copied, re-reading the live save dir afterwards could see newer files.
+                stats = copy_tree(
+                    source_dir,
+                    destination_folder,
+                    workers=self.copy_workers,
+                    progress=progress,
+                    checksums=True,
+                )
+                record.checksum = write_manifest(self._checksums_path(destination_folder), stats.file_hashes)
+            except BaseException:
+                # Don't leave a partial copy behind that looks like a backup.
+                shutil.rmtree(destination_folder, ignore_errors=True)
+                self._checksums_path(destination_folder).unlink(missing_ok=True)
+                raise
+            record.path = destination_folder
+            record.size = stats.bytes
+            record.file_count = stats.files
+
+        catalog.add(record)
+        self._backup_seconds.observe(time.perf_counter() - start_time, mode=self.backup_mode)
+        self._backup_bytes.set(record.size, mode=self.backup_mode)
+        self._backups.inc(mode=self.backup_mode, trigger=trigger)
 
         if self.rotate_backups:
             self._rotate_backups()
+        return record
+
+    @staticmethod
+    def _folder_stats(folder: str) -> tuple:
+        """Returns (total bytes, file count) for a folder."""
+        size = file_count = 0
+        for root, _, filenames in os.walk(folder):
+            for filename in filenames:
+                size += os.path.getsize(os.path.join(root, filename))
+                file_count += 1
+        return size, file_count
+
+    @staticmethod
+    def _checksums_path(backup_path: str) -> Path:
+        """Checksum manifest of a copy / archive backup, next to it."""
+        return Path(f"{backup_path}.checksums.json")
+
+    def _expected_files(self, record: BackupRecord) -> dict:
+        """{relative path: {"size", "sha256"}} the backup should restore, None if it has no checksums."""
+        if record.mode == "incremental":
+            files = self.backup_store.load_manifest(record.name)["files"]
+            return {path: {"size": entry["size"], "sha256": entry["hash"]} for path, entry in files.items()}
+        checksums_path = self._checksums_path(record.path)
+        if not checksums_path.exists():
+            return None
+        return load_manifest(checksums_path)
+
+    def _manifest_problems(self, record: BackupRecord) -> list:
+        """Checks the backup's manifest / archive against the checksum recorded in the catalog."""
+        if record.mode == "incremental":
+            manifest_path = self.backup_store.manifest_path(record.name)
+        elif record.mode == "archive":
+            manifest_path = Path(record.path)
+        else:
+            manifest_path = self._checksums_path(record.path)
+        if not manifest_path.exists():
+            return [f"missing {manifest_path}"]
+        if record.checksum and hash_file(manifest_path) != record.checksum:
+            return [f"{manifest_path.name} changed since the backup was taken"]
+        return []
+
+    def verify_backup(self, backup_name: str) -> list:
+        """Checks a cataloged backup against its checksums. Returns what's wrong, empty if it's intact.
+
+        Copies are checked file by file and incremental backups blob by blob. Archives are checked
+        as a whole, their files are checked when `restore_backup` extracts them.
+        """
+        record = self.backup_catalog.get(backup_name)
+        if record is None:
+            raise ValueError(f"Unknown backup: {backup_name}")
+        start_time = time.perf_counter()
+        problems = self._manifest_problems(record)
+        if not problems and record.mode == "incremental":
+            # Blobs are named by their sha256.
+            digests = sorted({entry["sha256"] for entry in self._expected_files(record).values()})
+            actual = hash_files([self.backup_store.blob_path(digest) for digest in digests], self.checksum_workers)
+            problems = [
+                f"blob {digest} is missing or corrupt" for digest, found in zip(digests, actual) if found != digest
+            ]
+        elif not problems and record.mode == "archive":
+            if not self._checksums_path(record.path).exists():
+                problems = ["no checksum manifest"]
+        elif not problems:
+            problems = verify_tree(record.path, self._expected_files(record), self.checksum_workers)
+
+        logger.info(
+            f"Verified backup {backup_name} in {time.perf_counter() - start_time:.2f}s: "
+            f"{'; '.join(problems) if problems else 'intact'}"
+        )
+        return problems
+
+    def restore_backup(
+        self,
+        backup_name: str,
+        verify: bool = True,  # Refuse to restore a backup whose files don't match its checksums (or that has none).
+        relaunch: bool = None,  # Launch the server afterwards. Defaults to whether it was running.
+        wait_for_rcon_port: bool = False,
+        wait_for_rcon_port_timeout: int = 10,
+    ) -> Path:
+        """Replaces the server's save dir with a backup, keeping the server down only for the swap.
+
+        The backup is copied / extracted next to the save dir and checked while the server still
+        runs. Only then is the server stopped, `Pal/Saved` swapped for the restored folder with two
+        renames and the server relaunched. The replaced save dir is kept as
+        `Pal/Saved.before_restore_<time>` and its path returned.
+
+        Run it on the watcher's scheduler thread (`scheduler.post`) if a watcher manages the server,
+        so it doesn't relaunch the server mid swap.
+        """
+        record = self.backup_catalog.get(backup_name)
+        if record is None:
+            raise ValueError(f"Unknown backup: {backup_name}")
+        timer = PhaseTimer()
+        save_dir = Path(self.palworld_server_save_dir)
+        # Next to the save dir, so the swap is a rename on the same filesystem.
+        staging_root = save_dir.parent / f".restore_{backup_name}"
+        staged = staging_root / save_dir.name
+        if staging_root.exists():
+            shutil.rmtree(staging_root)
+
+        logger.info(f"Preparing restore of {record.mode} backup {backup_name}...")
+        try:
+            with timer.phase("stage"):
+                if record.mode == "incremental":
+                    # Copies, not hardlinks: the server would write into the store's blobs.
+                    self.backup_store.materialize(backup_name, staged, hardlink=False)
+                elif record.mode == "archive":
+                    extract_archive(record.path, staging_root)
+                    extracted = [path for path in staging_root.iterdir() if path.is_dir()]
+                    if len(extracted) == 1 and extracted[0] != staged:
+                        os.rename(extracted[0], staged)
+                else:
+                    copy_tree(record.path, staged, workers=self.copy_workers)
+                staged.mkdir(parents=True, exist_ok=True)  # An empty backup restores an empty folder.
+
+            if verify:
+                with timer.phase("verify"):
+                    problems = self._manifest_problems(record)
+                    files = self._expected_files(record)
+                    if files is None:
+                        problems.append("no checksum manifest, pass verify=False to restore it anyway")
+                    else:
+                        problems += verify_tree(staged, files, self.checksum_workers)
+                    if problems:
+                        raise BackupVerificationError(f"Backup {backup_name} failed verification", problems)
+                    logger.info(f"Backup {backup_name} verified: {len(files)} files match their checksums.")
+        except BaseException:
+            shutil.rmtree(staging_root, ignore_errors=True)
+            raise
+
+        # A background backup would read the save dir while it's swapped.
+        self.backup_worker.cancel()
+        self.log_and_broadcast(f"Restoring backup {backup_name}, the server restarts now.")
+        with timer.phase("stop"):
+            was_running = self.stop_server()
+
+        relaunch = relaunch or (relaunch is None and was_running)
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        previous = save_dir.with_name(f"{save_dir.name}.before_restore_{stamp}")
+        counter = 1
+        while previous.exists():  # Several restores within a second.
+            previous = save_dir.with_name(f"{save_dir.name}.before_restore_{stamp}_{counter}")
+            counter += 1
+
+        swapped = False
+        try:
+            with timer.phase("swap"):
+                if save_dir.exists():
+                    os.rename(save_dir, previous)
+                try:
+                    os.rename(staged, save_dir)
+                except OSError:
+                    if previous.exists() and not save_dir.exists():
+                        os.rename(previous, save_dir)
+                    raise
+            swapped = True
+        finally:
+            shutil.rmtree(staging_root, ignore_errors=True)
+            if relaunch and swapped:
+                with timer.phase("launch"):
+                    self.launch_server(
+                        update_server=False,
+                        wait_for_rcon_port=wait_for_rcon_port,
+                        wait_for_rcon_port_timeout=wait_for_rcon_port_timeout,
+                    )
+            elif relaunch:
+                # Don't leave the server down, and don't hide why the restore failed.
+                logger.error(f"Restore of backup {backup_name} failed, relaunching the server with its previous save dir.")
+                try:
+                    self.launch_server(update_server=False)
+                except Exception as e:
+                    logger.error(f"Failed to relaunch the server: {e}")
+
+        self.last_restore_phases = dict(timer.durations)
+        self._restores.inc()
+        downtime = sum(timer.durations.get(phase, 0.0) for phase in ("stop", "swap", "launch"))
+        logger.info(
+            f"Restored backup {backup_name}, server down for {downtime:.1f}s ({timer.summary()}). "
+            f"Previous save dir kept in {previous}"
+        )
+        return previous
+
+    def materialize_backup(self, backup_name: str, destination_dir: str) -> Path:
+        """Recreates an incremental backup as a normal folder (hardlinked to the store)."""
+        return self.backup_store.materialize(backup_name, destination_dir)
 
     def _rotate_backups(self):
-        """Delete oldest backups if over `self.rotate_after_x_backups`."""
-        backups = sorted(self.backups_dir.iterdir(), key=os.path.getmtime)
+        """Delete backups the retention policy no longer keeps.
+
+        Keeps the newest `rotate_after_x_backups`, plus the newest backup of each of the last
+        `keep_hourly_backups` hours / `keep_daily_backups` days / `keep_weekly_backups` weeks.
+        """
+        policy = RetentionPolicy(
+            keep_last=self.rotate_after_x_backups,
+            keep_hourly=self.keep_hourly_backups,
+            keep_daily=self.keep_daily_backups,
+            keep_weekly=self.keep_weekly_backups,
+        )
+        expired = self.backup_catalog.select_expired(policy)
+        for record in expired:
+            self.delete_backup(record, gc=False)
+        if any(record.mode == "incremental" for record in expired):
+            self.backup_store.gc()
 
-        # Keep only the newest backups
-        backups_to_delete = backups[: -self.rotate_after_x_backups]
-        for backup in backups_to_delete:
+    def delete_backup(self, record: BackupRecord, gc: bool = True) -> None:
+        """Deletes a cataloged backup from disk and from the catalog."""
+        try:
+            if record.mode == "incremental":
+                self.backup_store.delete_snapshot(record.name)
+                if gc:
+                    self.backup_store.gc()
+            elif os.path.isdir(record.path):
+                shutil.rmtree(record.path)
+            else:
+                os.remove(record.path)
+            if record.mode != "incremental":
+                self._checksums_path(record.path).unlink(missing_ok=True)
+        except FileNotFoundError:
+            logger.warning(f"Backup already missing from disk: {record.path}")
+        self.backup_catalog.remove(record.name)
+        logger.info(f"Deleted old backup: {record.path}")
+
+    def _import_existing_backups(self):
+        """One-time import of backups taken before the catalog existed."""
+        save_dir_name = os.path.basename(self.palworld_server_save_dir)
+        archive_suffixes = tuple(suffix for suffix, _ in CODECS.values())
+        records = []
+        for backup in Path(self.backups_dir).iterdir():
+            if not backup.name.startswith(save_dir_name + "_"):
+                continue
             if backup.is_dir():
-                shutil.rmtree(backup)
-                logger.info(f"Deleted old backup: {backup}")
+                mode = "copy"
+                size, file_count = self._folder_stats(backup)
+            elif backup.name.endswith(archive_suffixes):
+                mode = "archive"
+                size, file_count = backup.stat().st_size, None
+            else:
+                continue
+            records.append(
+                BackupRecord(
+                    name=backup.name,
+                    mode=mode,
+                    path=str(backup),
+                    created_at=backup.stat().st_mtime,
+                    size=size,
+                    file_count=file_count,
+                    trigger="imported",
+                )
+            )
+
+        store_dir = Path(self.backups_dir) / "store"
+        if store_dir.is_dir():
+            for snapshot in self.backup_store.list_snapshots():
+                manifest = self.backup_store.load_manifest(snapshot)
+                records.append(
+                    BackupRecord(
+                        name=snapshot,
+                        mode="incremental",
+                        path=str(self.backup_store.manifest_path(snapshot)),
+                        created_at=manifest["created_at"],
+                        size=sum(entry["size"] for entry in manifest["files"].values()),
+                        file_count=len(manifest["files"]),
+                        trigger="imported",
+                    )
+                )
+
+        for record in records:
+            self._backup_catalog.add(record)
+        if records:
+            logger.info(f"Imported {len(records)} existing backups into the backup catalog.")
 
     def restart_server(
         self,
@@ -244,39 +964,124 @@ class PalworldUtil:
         backup_server: bool = True,
         wait_for_rcon_port: bool = False,
         wait_for_rcon_port_timeout: int = 10,
-    ):
-        """Restart Palword server with extra maintenance options."""
-        # Sleep before starting server restart process.
-        restart_warning_msg = f"Waiting {self.wait_before_restart_seconds} seconds before starting restart process."
-        self.log_and_broadcast(restart_warning_msg)
-        time.sleep(self.wait_before_restart_seconds)
+        update_during_countdown: bool = None,  # Run steamcmd while players are warned. Defaults to True on linux only, windows locks the running server's files.
+    ) -> dict:
+        """Restart Palword server with extra maintenance options.
 
-        self.log_and_broadcast("Server restart process started.")
+        Independent phases overlap so players are only locked out for stop + launch:
+        * steamcmd runs during the warning countdown (linux) or alongside the save snapshot.
+        * Slow backups (archive / incremental) are taken from a quick snapshot while the server boots.
 
-        # Save game state if needed.
-        if save_game:
-            self.save_server_state()
+        Returns seconds per phase, also kept in `last_restart_phases`.
+        """
+        if update_during_countdown is None:
+            update_during_countdown = self.operating_system == "linux"
+        timer = PhaseTimer()
 
-        self.log_and_broadcast("Restarting server now.")
+        def timed(phase: str, func, *args, **kwargs):
+            with timer.phase(phase):
+                return func(*args, **kwargs)
 
-        # Find and end server process.
-        if check_for_process(self.palworld_server_proc_name):
-            logger.info("Ending palworld server process.")
-            kill_process(self.palworld_server_proc_name)
-        else:
-            logger.error(
-                f"Couldn't find palworld server process: ({self.palworld_server_proc_name})"
-            )
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="restart") as executor:
+            update_future = None
+            if check_for_server_updates and update_during_countdown:
+                update_future = executor.submit(timed, "update", self.update_game_server)
 
-        # Take backup of server if needed.
-        if backup_server:
-            self.take_server_backup()
-        else:
-            logger.info("Skipping server backup.")
+            # Sleep before starting server restart process.
+            with timer.phase("countdown"):
+                restart_warning_msg = f"Waiting {self.wait_before_restart_seconds} seconds before starting restart process."
+                self.log_and_broadcast(restart_warning_msg)
+                time.sleep(self.wait_before_restart_seconds)
 
-        # Launch server.
-        self.launch_server(
-            update_server=check_for_server_updates,
-            wait_for_rcon_port=wait_for_rcon_port,
-            wait_for_rcon_port_timeout=wait_for_rcon_port_timeout,
-        )
+            self.log_and_broadcast("Server restart process started.")
+
+            # Save game state if needed.
+            if save_game:
+                timed("save", self.save_server_state)
+
+            self.log_and_broadcast("Restarting server now.")
+
+            with timer.phase("lockout"):
+                # A background backup reading the save dir would race the shutdown. If the restart
+                # takes its own backup it replaces the running one, otherwise let it finish.
+                if self.backup_worker.busy:
+                    with timer.phase("backup_worker_wait"):
+                        if backup_server:
+                            self.backup_worker.cancel()
+                        else:
+                            logger.info("Waiting for the running backup to finish before stopping.")
+                            self.backup_worker.wait()
+
+                # End server process.
+                logger.info("Ending palworld server process.")
+                if not timed("stop", self.stop_server):
+                    logger.error(
+                        f"Couldn't find palworld server process: ({self.palworld_server_proc_name})"
+                    )
+
+                if check_for_server_updates and update_future is None:
+                    update_future = executor.submit(timed, "update", self.update_game_server)
+
+                # Take backup of server if needed. Full copies are quick enough to be the snapshot
+                # themselves, other modes snapshot first and back up from that once we've relaunched.
+                staging_dir = None
+                if not backup_server:
+                    logger.info("Skipping server backup.")
+                elif self.backup_mode == "copy":
+                    timed("backup", self.take_server_backup, trigger="restart")
+                else:
+                    staging_dir = (
+                        Path(self.backups_dir)
+                        / ".restart_staging"
+                        / os.path.basename(self.palworld_server_save_dir)
+                    )
+                    if staging_dir.parent.exists():
+                        shutil.rmtree(staging_dir.parent)
+                    timed(
+                        "snapshot",
+                        copy_tree,
+                        self.palworld_server_save_dir,
+                        staging_dir,
+                        workers=self.copy_workers,
+                    )
+
+                if update_future is not None:
+                    with timer.phase("update_wait"):
+                        update_future.result()
+
+                backup_future = None
+                if staging_dir is not None:
+                    backup_future = executor.submit(
+                        timed,
+                        "backup",
+                        self._backup_from_staging,
+                        staging_dir,
+                    )
+
+                # Launch server.
+                timed("launch", self.launch_server, update_server=False)
+
+            if wait_for_rcon_port:
+                timed(
+                    "rcon_ready",
+                    self.probe_server_ready,
+                    self.last_launch_at,
+                    timeout_secs=wait_for_rcon_port_timeout,
+                )
+
+            if backup_future is not None:
+                with timer.phase("backup_wait"):
+                    backup_future.result()
+
+        self.last_restart_phases = dict(timer.durations)
+        self._restarts.inc()
+        for phase, seconds in self.last_restart_phases.items():
+            self._restart_phase_seconds.set(seconds, phase=phase)
+        logger.info(f"Restart phases: {timer.summary()}")
+        return self.last_restart_phases
+
+    def _backup_from_staging(self, staging_dir: Path):
+        try:
+            self.take_server_backup(trigger="restart", source_dir=staging_dir)
+        finally:
+            shutil.rmtree(staging_dir.parent, ignore_errors=True)
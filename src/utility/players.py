@@ -0,0 +1,152 @@
+"""Typed player list from the `ShowPlayers` rcon command, with join/leave tracking.
+
+`ShowPlayers` answers with csv like:
+
+    name,playeruid,steamid
+    Gavin,1234567890,76561198000000000
+
+Player names can contain commas, so rows are split from the right.
+"""
+
+import json
+import threading
+import time
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from loguru import logger
+
+from palworld_rcon.source_rcon import RconError, SourceRcon
+
+
+class Player:
+    __slots__ = ("name", "playeruid", "steamid")
+
+    def __init__(self, name: str, playeruid: str, steamid: str) -> None:
+        self.name = name
+        self.playeruid = playeruid
+        self.steamid = steamid
+
+    @property
+    def key(self) -> str:
+        """steamid, or playeruid for players without one (e.g. not yet fully joined)."""
+        if self.steamid and self.steamid.strip("0"):
+            return self.steamid
+        return self.playeruid
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Player):
+            return NotImplemented
+        return (self.name, self.playeruid, self.steamid) == (
+            other.name,
+            other.playeruid,
+            other.steamid,
+        )
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f"Player(name={self.name!r}, playeruid={self.playeruid!r}, steamid={self.steamid!r})"
+
+
+def parse_players(response: str) -> dict:
+    """Parses a `ShowPlayers` response into {player.key: Player}."""
+    players = {}
+    for line in response.splitlines()[1:]:  # Skip the header.
+        line = line.strip()
+        if not line:
+            continue
+        parts = line.rsplit(",", 2)
+        if len(parts) != 3:
+            logger.debug(f"Skipping malformed ShowPlayers row: {line!r}")
+            continue
+        player = Player(*parts)
+        players[player.key] = player
+    return players
+
+
+@dataclass
+class PlayerDiff:
+    joined: list = field(default_factory=list)
+    left: list = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.joined or self.left)
+
+
+class PlayerPoller:
+    """Polls `ShowPlayers` once per tick for every consumer and hands out only what changed.
+
+    Listeners are called with a `PlayerDiff` whenever players joined or left. With `history_file`,
+    every finished online session is appended to it as a json line.
+    """
+
+    def __init__(self, rcon: SourceRcon, history_file: str = None, timeout: int = 10) -> None:
+        self.rcon = rcon
+        self.history_file = Path(history_file) if history_file else None
+        self.timeout = timeout
+        self.players: dict[str, Player] = {}  # Last snapshot, keyed by `Player.key`.
+        self.joined_at: dict[str, float] = {}  # Unix timestamp each online player was first seen.
+        self.polled_at: float = None
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback: callable) -> None:
+        self._listeners.append(callback)
+
+    def poll(self) -> PlayerDiff:
+        """Fetches the player list and returns who joined / left since the last poll.
+
+        Returns None (keeping the last snapshot) if the server couldn't be reached.
+        """
+        try:
+            response = self.rcon.query("ShowPlayers", timeout=self.timeout)
+        except RconError as e:
+            logger.warning(f"Couldn't poll players: {e}")
+            return None
+        return self.update(parse_players(response))
+
+    def update(self, players: dict) -> PlayerDiff:
+        """Replaces the snapshot with `players` and returns the diff."""
+        now = time.time()
+        with self._lock:
+            diff = PlayerDiff(
+                joined=[player for key, player in players.items() if key not in self.players],
+                left=[player for key, player in self.players.items() if key not in players],
+            )
+            for player in diff.joined:
+                self.joined_at[player.key] = now
+            sessions = [
+                (player, self.joined_at.pop(player.key, self.polled_at or now)) for player in diff.left
+            ]
+            self.players = players
+            self.polled_at = now
+
+        if sessions and self.history_file:
+            self._record_sessions(sessions, now)
+        if diff:
+            for callback in self._listeners:
+                try:
+                    callback(diff)
+                except Exception:
+                    logger.exception("Player listener failed.")
+        return diff
+
+    def clear(self) -> PlayerDiff:
+        """Marks everyone as left, e.g. when the server stopped."""
+        return self.update({})
+
+    def _record_sessions(self, sessions: list, left_at: float) -> None:
+        with open(self.history_file, "a", encoding="utf-8") as f:
+            for player, joined_at in sessions:
+                session = {
+                    "name": player.name,
+                    "playeruid": player.playeruid,
+                    "steamid": player.steamid,
+                    "joined_at": joined_at,
+                    "left_at": left_at,
+                    "seconds": left_at - joined_at,
+                }
+                f.write(json.dumps(session) + "\n")
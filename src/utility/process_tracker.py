@@ -0,0 +1,280 @@
+"""Tracks the palworld server processes we launched by pid instead of scanning by name."""
+
+import json
+import os
+import select
+import subprocess
+import time
+
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import psutil
+from loguru import logger
+
+
+@dataclass
+class TrackedProcess:
+    pid: int
+    create_time: float  # Guards against pid reuse, a recycled pid won't have the same create time.
+    name: str
+
+    def get(self) -> psutil.Process:
+        """Returns the live process, or None if it exited (or the pid was reused)."""
+        try:
+            process = psutil.Process(self.pid)
+            if abs(process.create_time() - self.create_time) > 0.01:
+                return None
+            if process.status() == psutil.STATUS_ZOMBIE:
+                return None
+            return process
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+
+
+class ServerProcessTracker:
+    """Remembers the server process (and its launcher) by pid + create time in a pidfile.
+
+    Only `track_launch` ever looks at the process list, and only for a few seconds after a launch to
+    find the real server binary behind the launcher (`PalServer.sh` / `PalServer.exe`). Liveness
+    checks and kills after that touch only the tracked pids.
+    """
+
+    def __init__(
+        self,
+        pidfile: str,
+        server_dir: str,
+        proc_name_prefix: str = "PalServer",  # Matches the launcher and the real server binary.
+    ) -> None:
+        self.pidfile = Path(pidfile)
+        self.server_dir = Path(server_dir).resolve()
+        self.proc_name_prefix = proc_name_prefix
+        self.server: TrackedProcess = None  # The process actually running the game server.
+        self.launcher: TrackedProcess = None  # What we spawned, if it's still around.
+        self.load()
+
+    @property
+    def tracking(self) -> bool:
+        return self.server is not None or self.launcher is not None
+
+    def load(self) -> None:
+        """Loads tracked processes from the pidfile, e.g. after a watcher restart."""
+        if not self.pidfile.exists():
+            return
+        try:
+            with open(self.pidfile, encoding="utf-8") as f:
+                data = json.load(f)
+            self.server = TrackedProcess(**data["server"]) if data.get("server") else None
+            self.launcher = TrackedProcess(**data["launcher"]) if data.get("launcher") else None
+            logger.debug(f"Loaded tracked server processes from {self.pidfile}: {data}")
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable pidfile {self.pidfile}: {e}")
+
+    def save(self) -> None:
+        data = {
+            "server": asdict(self.server) if self.server else None,
+            "launcher": asdict(self.launcher) if self.launcher else None,
+        }
+        temp_path = self.pidfile.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.pidfile)
+
+    def clear(self) -> None:
+        self.server = self.launcher = None
+        if self.pidfile.exists():
+            os.remove(self.pidfile)
+
+    def track_launch(
+        self,
+        launcher_pid: int,
+        spawn_time: float,
+        timeout: float = 15,
+        popen: subprocess.Popen = None,  # The launcher, so it can be reaped when it exits instead of lingering as a zombie.
+    ) -> bool:
+        """Finds and records the server process started at `spawn_time`. Returns True if found."""
+        self.launcher = self._track_pid(launcher_pid)
+        self.server = None
+
+        # Give the launcher a moment to start the real server binary before settling for a launcher.
+        deadline = time.monotonic() + timeout
+        while True:
+            if popen is not None:
+                popen.poll()
+            launchers_only = time.monotonic() >= deadline
+            self.server = self._find_server_process(launcher_pid, spawn_time, launchers_only)
+            if self.server or launchers_only:
+                break
+            time.sleep(0.5)
+
+        if self.launcher is not None and self.launcher.get() is None:
+            self.launcher = None  # Exited (or a zombie), e.g. `gnome-terminal -- ./PalServer.sh`.
+        if self.server:
+            logger.info(f"Tracking server process {self.server.name} (pid {self.server.pid}).")
+        else:
+            logger.warning(
+                "Couldn't find the server process after launch, only the launcher is tracked."
+            )
+        self.save()
+        return self.server is not None
+
+    @staticmethod
+    def _track_pid(pid: int) -> TrackedProcess:
+        try:
+            process = psutil.Process(pid)
+            return TrackedProcess(pid, process.create_time(), process.name())
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+
+    def _find_server_process(
+        self, launcher_pid: int, spawn_time: float, accept_launcher: bool = False
+    ) -> TrackedProcess:
+        # Prefer our own descendants. Launchers like `start`, terminals or PalServer.exe often
+        # detach (and may linger as zombies), so fall back to a scan for a server process started
+        # after the spawn whenever none of them is the server.
+        descendants = []
+        try:
+            launcher = psutil.Process(launcher_pid)
+            if launcher.status() != psutil.STATUS_ZOMBIE:
+                descendants = [launcher] + launcher.children(recursive=True)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+        return self._match_server(descendants, spawn_time) or self._match_server(
+            psutil.process_iter(), spawn_time, accept_launcher
+        )
+
+    def _match_server(self, candidates, spawn_time: float, accept_launcher: bool = False) -> TrackedProcess:
+        matches = []
+        for process in candidates:
+            try:
+                name = process.name()
+                if not name.startswith(self.proc_name_prefix):
+                    continue
+                create_time = process.create_time()
+                if (
+                    create_time >= spawn_time - 1
+                    and process.status() != psutil.STATUS_ZOMBIE
+                    and self._belongs_to_server(process)
+                ):
+                    matches.append(TrackedProcess(process.pid, create_time, name))
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+
+        # The real server is the last process in the launch chain, e.g. PalServer.sh -> PalServer-Linux-Shipping.
+        servers = [m for m in matches if not m.name.endswith((".sh", "PalServer.exe"))]
+        if not servers and accept_launcher:
+            servers = matches
+        if not servers:
+            return None
+        return max(servers, key=lambda m: m.create_time)
+
+    def _belongs_to_server(self, process: psutil.Process, strict: bool = False) -> bool:
+        """True unless the process provably runs out of another server install.
+
+        With `strict`, a process whose exe and cwd are both outside the install dir doesn't belong
+        either (e.g. `PalServer.sh` started from another install, whose exe is the shell).
+        """
+        known = False
+        for attribute in ("exe", "cwd"):
+            try:
+                path = Path(getattr(process, attribute)()).resolve()
+            except (psutil.AccessDenied, psutil.ZombieProcess, OSError, ValueError):
+                continue
+            if path == self.server_dir or self.server_dir in path.parents:
+                return True
+            if attribute == "exe" and path.name.startswith(self.proc_name_prefix):
+                return False  # A server binary from another install dir.
+            known = True
+        return not (strict and known)
+
+    def find_processes(self, name: str) -> list:
+        """Running processes called `name` that belong to this server install.
+
+        A full process scan, for when nothing is tracked. Servers run out of other install dirs
+        (e.g. other instances on the same host) are left out.
+        """
+        processes = []
+        for process in psutil.process_iter():
+            try:
+                if process.name() == name and self._belongs_to_server(process, strict=True):
+                    processes.append(process)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return processes
+
+    def is_running(self) -> bool:
+        """O(1) liveness check of the tracked server (or launcher, if the server wasn't found)."""
+        tracked = self.server or self.launcher
+        return tracked is not None and tracked.get() is not None
+
+    def wait_for_exit(self, timeout: float = None) -> bool:
+        """Blocks until the tracked server exits. Returns False if `timeout` seconds pass first.
+
+        Uses a pidfd on linux so the wakeup is instant, otherwise `psutil.Process.wait`.
+        """
+        tracked = self.server or self.launcher
+        process = tracked.get() if tracked else None
+        if process is None:
+            return True
+
+        if hasattr(os, "pidfd_open"):
+            try:
+                pidfd = os.pidfd_open(process.pid)
+            except OSError:
+                pidfd = None
+            if pidfd is not None:
+                try:
+                    # The pid could have been reused between get() and pidfd_open().
+                    if tracked.get() is None:
+                        return True
+                    readable, _, _ = select.select([pidfd], [], [], timeout)
+                    return bool(readable)
+                finally:
+                    os.close(pidfd)
+
+        try:
+            process.wait(timeout)
+            return True
+        except psutil.TimeoutExpired:
+            return False
+        except psutil.NoSuchProcess:
+            return True
+
+    def stop(self, timeout: float = 30) -> bool:
+        """Terminates the tracked processes, killing whatever is still alive after `timeout` seconds.
+
+        Returns True if anything was running.
+        """
+        processes = {}
+        for tracked in (self.server, self.launcher):
+            process = tracked.get() if tracked else None
+            if process is None:
+                continue
+            # Also take down anything the tracked processes started, e.g. the binary behind PalServer.sh.
+            try:
+                family = [process] + process.children(recursive=True)
+            except psutil.NoSuchProcess:
+                family = [process]
+            processes.update((p.pid, p) for p in family)
+        processes = list(processes.values())
+        if not processes:
+            self.clear()
+            return False
+
+        for process in processes:
+            try:
+                logger.debug(f"Terminating {process.name()} (pid {process.pid}).")
+                process.terminate()
+            except psutil.NoSuchProcess:
+                pass
+        _, alive = psutil.wait_procs(processes, timeout=timeout)
+        for process in alive:
+            try:
+                logger.warning(f"{process.name()} (pid {process.pid}) didn't exit, killing it.")
+                process.kill()
+            except psutil.NoSuchProcess:
+                pass
+        psutil.wait_procs(alive, timeout=5)
+
+        self.clear()
+        return True
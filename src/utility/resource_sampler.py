@@ -0,0 +1,201 @@
+"""Samples the tracked server's resource use into a fixed-size history.
+
+Samples are kept in `array`-backed ring buffers (one per field, 8 bytes per value), so a day of
+samples costs a few hundred KB and never grows. A least-squares fit over recent RSS samples gives the
+memory growth rate, which is used to restart the server before it runs out of memory rather than on
+a fixed clock.
+"""
+
+import array
+import math
+import time
+
+from dataclasses import dataclass, fields
+
+import psutil
+from loguru import logger
+
+from utility.process_tracker import ServerProcessTracker
+
+
+class RingBuffer:
+    """Fixed capacity buffer of floats. Oldest values are overwritten once it's full."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._values = array.array("d", bytes(8 * capacity))
+        self._next = 0  # Index the next value is written to.
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, value: float) -> None:
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def values(self) -> array.array:
+        """Values oldest first."""
+        if self._count < self.capacity:
+            return self._values[: self._count]
+        return self._values[self._next :] + self._values[: self._next]
+
+    def last(self) -> float:
+        if not self._count:
+            return None
+        return self._values[self._next - 1]
+
+    def clear(self) -> None:
+        self._next = self._count = 0
+
+
+@dataclass
+class ResourceSample:
+    timestamp: float  # Unix timestamp.
+    rss: float  # Bytes.
+    cpu_percent: float  # Of one core, so can go over 100.
+    threads: float
+    read_bytes: float  # Cumulative, nan if the platform doesn't report it.
+    write_bytes: float
+
+
+class ResourceHistory:
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._buffers = {field.name: RingBuffer(capacity) for field in fields(ResourceSample)}
+
+    def __len__(self) -> int:
+        return len(self._buffers["timestamp"])
+
+    def append(self, sample: ResourceSample) -> None:
+        for name, buffer in self._buffers.items():
+            buffer.append(getattr(sample, name))
+
+    def clear(self) -> None:
+        for buffer in self._buffers.values():
+            buffer.clear()
+
+    def series(self, name: str, since: float = None) -> tuple:
+        """(timestamps, values) of one field, oldest first, optionally only from `since` on."""
+        timestamps = self._buffers["timestamp"].values()
+        values = self._buffers[name].values()
+        if since is not None:
+            start = next((i for i, t in enumerate(timestamps) if t >= since), len(timestamps))
+            timestamps, values = timestamps[start:], values[start:]
+        return timestamps, values
+
+    def samples(self, since: float = None) -> list:
+        columns = [self.series(field.name, since)[1] for field in fields(ResourceSample)]
+        return [ResourceSample(*row) for row in zip(*columns)]
+
+    def latest(self) -> ResourceSample:
+        if not len(self):
+            return None
+        return ResourceSample(*(buffer.last() for buffer in self._buffers.values()))
+
+
+def linear_fit(xs, ys) -> tuple:
+    """Least-squares (slope, intercept) of ys over xs. None if there's nothing to fit."""
+    count = len(xs)
+    if count < 2:
+        return None
+    mean_x = math.fsum(xs) / count
+    mean_y = math.fsum(ys) / count
+    variance = math.fsum((x - mean_x) ** 2 for x in xs)
+    if variance == 0:
+        return None
+    slope = math.fsum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+    return slope, mean_y - slope * mean_x
+
+
+class ResourceSampler:
+    """Records samples of the tracked server process. Call `sample()` periodically.
+
+    The history starts over whenever the tracked server process changes (e.g. after a restart).
+    """
+
+    def __init__(self, tracker: ServerProcessTracker, capacity: int = 2880) -> None:
+        self.tracker = tracker
+        self.history = ResourceHistory(capacity)
+        self._process: psutil.Process = None
+        self._process_key = None  # (pid, create_time) the history belongs to.
+        self._warned_untracked = False
+
+    def sample(self) -> ResourceSample:
+        """Takes one sample. Returns None if no server process is tracked or running."""
+        # Never the launcher, a shell or terminal says nothing about the server's memory.
+        tracked = self.tracker.server
+        process = tracked.get() if tracked else None
+        if process is None:
+            if not self._warned_untracked:
+                logger.warning("No running server process is tracked, not sampling server resources.")
+                self._warned_untracked = True
+            return None
+        self._warned_untracked = False
+
+        process_key = (tracked.pid, tracked.create_time)
+        if process_key != self._process_key:
+            self.history.clear()
+            self._process = process
+            self._process_key = process_key
+            self._process.cpu_percent(None)  # First call only sets the baseline.
+
+        try:
+            with self._process.oneshot():
+                rss = self._process.memory_info().rss
+                cpu_percent = self._process.cpu_percent(None)
+                threads = self._process.num_threads()
+                try:
+                    io = self._process.io_counters()
+                    read_bytes, write_bytes = io.read_bytes, io.write_bytes
+                except (psutil.AccessDenied, AttributeError, NotImplementedError):
+                    read_bytes = write_bytes = math.nan
+        except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
+            logger.debug(f"Couldn't sample server process: {e}")
+            return None
+
+        sample = ResourceSample(time.time(), rss, cpu_percent, threads, read_bytes, write_bytes)
+        self.history.append(sample)
+        return sample
+
+    def memory_growth_rate(self, window_seconds: float = 3600) -> float:
+        """RSS growth in bytes per second over the last `window_seconds`, None if unknown."""
+        timestamps, rss = self.history.series("rss", since=time.time() - window_seconds)
+        fit = linear_fit(timestamps, rss)
+        return fit[0] if fit else None
+
+    def projected_rss(self, seconds_ahead: float, window_seconds: float = 3600) -> float:
+        """RSS expected `seconds_ahead` from now if the recent trend continues."""
+        timestamps, rss = self.history.series("rss", since=time.time() - window_seconds)
+        fit = linear_fit(timestamps, rss)
+        if fit is None:
+            return None
+        slope, intercept = fit
+        return slope * (time.time() + seconds_ahead) + intercept
+
+    def memory_restart_reason(
+        self,
+        threshold_bytes: float,
+        horizon_seconds: float = 1800,  # Restart if the threshold will be crossed within this long.
+        window_seconds: float = 3600,  # Samples the growth rate is fitted over.
+        min_samples: int = 10,  # Don't trust a projection from fewer samples than this.
+    ) -> str:
+        """Why the server should be restarted for its memory use, or None if it shouldn't."""
+        latest = self.history.latest()
+        if latest is None:
+            return None
+        if latest.rss >= threshold_bytes:
+            return f"memory use {latest.rss / 2**20:.0f} MB is over {threshold_bytes / 2**20:.0f} MB"
+
+        timestamps, _ = self.history.series("rss", since=time.time() - window_seconds)
+        if len(timestamps) < min_samples:
+            return None
+        projected = self.projected_rss(horizon_seconds, window_seconds)
+        if projected is not None and projected >= threshold_bytes:
+            growth = self.memory_growth_rate(window_seconds) * 3600 / 2**20
+            return (
+                f"memory use {latest.rss / 2**20:.0f} MB growing {growth:.0f} MB/h, "
+                f"projected over {threshold_bytes / 2**20:.0f} MB within {horizon_seconds / 60:.0f} minutes"
+            )
+        return None
@@ -0,0 +1,155 @@
+"""Priority queue scheduler for the watcher's timed jobs.
+
+Jobs are kept in a heap ordered by their next run time and the scheduler thread sleeps until exactly
+the next one is due, or until an event is posted from another thread (e.g. the server process
+exited). Periodic jobs advance by whole intervals from their previous due time, so they don't drift,
+and next run times can be saved to a state file so restarting the watcher doesn't reset every timer.
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from loguru import logger
+
+
+@dataclass(order=True)
+class Job:
+    next_run: float  # Unix timestamp.
+    name: str = field(compare=False)
+    interval: float = field(compare=False)  # Seconds.
+    callback: callable = field(compare=False, repr=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+class Scheduler:
+    def __init__(self, state_file: str = None) -> None:
+        self.state_file = Path(state_file) if state_file else None
+        self.jobs: dict[str, Job] = {}
+        self._heap: list[Job] = []
+        self._events: list = []  # Callbacks posted from other threads, run before any due job.
+        self._condition = threading.Condition()
+        self._running = False
+        self._saved_state = self._load_state()
+
+    def _load_state(self) -> dict:
+        if not self.state_file or not self.state_file.exists():
+            return {}
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable scheduler state {self.state_file}: {e}")
+            return {}
+
+    def _save_state(self) -> None:
+        if not self.state_file:
+            return
+        state = {name: job.next_run for name, job in self.jobs.items()}
+        temp_path = self.state_file.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_file)
+
+    def add_job(
+        self,
+        name: str,
+        interval_seconds: float,
+        callback: callable,
+        first_run: float = None,  # Unix timestamp, defaults to the saved state or one interval from now.
+    ) -> Job:
+        """Adds a periodic job. Replaces any existing job with the same name."""
+        if first_run is None:
+            first_run = self._saved_state.get(name, time.time() + interval_seconds)
+        with self._condition:
+            if name in self.jobs:
+                self.jobs[name].cancelled = True
+            job = Job(first_run, name, interval_seconds, callback)
+            self.jobs[name] = job
+            heapq.heappush(self._heap, job)
+            self._save_state()
+            self._condition.notify()
+        return job
+
+    def reschedule(self, name: str, delay_seconds: float = None) -> None:
+        """Moves a job's next run to `delay_seconds` from now (a full interval if not provided)."""
+        with self._condition:
+            job = self.jobs[name]
+            job.cancelled = True
+            new_job = Job(
+                time.time() + (job.interval if delay_seconds is None else delay_seconds),
+                job.name,
+                job.interval,
+                job.callback,
+            )
+            self.jobs[name] = new_job
+            heapq.heappush(self._heap, new_job)
+            self._save_state()
+            self._condition.notify()
+
+    def seconds_until(self, name: str) -> float:
+        return self.jobs[name].next_run - time.time()
+
+    def post(self, callback: callable) -> None:
+        """Runs `callback` on the scheduler thread as soon as possible. Safe to call from any thread."""
+        with self._condition:
+            self._events.append(callback)
+            self._condition.notify()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+    def run_forever(self) -> None:
+        """Runs jobs and posted events on the calling thread until `stop()` is called."""
+        self._running = True
+        while True:
+            with self._condition:
+                while self._running and not self._events and not self._due_job():
+                    self._condition.wait(timeout=self._seconds_to_next_job())
+                if not self._running:
+                    return
+                if self._events:
+                    callback, job = self._events.pop(0), None
+                else:
+                    job = heapq.heappop(self._heap)
+                    callback = job.callback
+
+            try:
+                callback()
+            except Exception:
+                logger.exception(f"Scheduled {job.name if job else 'event'} failed.")
+
+            if job is not None:
+                self._advance(job)
+
+    def _due_job(self) -> bool:
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+        return bool(self._heap) and self._heap[0].next_run <= time.time()
+
+    def _seconds_to_next_job(self) -> float:
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0].next_run - time.time())
+
+    def _advance(self, job: Job) -> None:
+        """Queues the job's next run a whole number of intervals after its last due time."""
+        with self._condition:
+            if job.cancelled:  # Rescheduled while it was running.
+                return
+            now = time.time()
+            next_run = job.next_run + job.interval
+            if next_run <= now:
+                # We fell behind (e.g. a long backup), skip the missed runs instead of bursting.
+                missed = int((now - next_run) // job.interval) + 1
+                next_run += missed * job.interval
+            job.next_run = next_run
+            heapq.heappush(self._heap, job)
+            self._save_state()
@@ -0,0 +1,248 @@
+"""Decides when steamcmd actually needs to run for the dedicated server.
+
+The installed build id is read from `steamapps/appmanifest_<app_id>.acf` and compared with the
+latest public build (asked from steamcmd at most once per `latest_build_ttl` seconds). steamcmd is
+skipped entirely when they match, and the slow `validate` (hashes the whole install) only runs on a
+schedule or after something looked corrupt.
+"""
+
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+
+from pathlib import Path
+
+from loguru import logger
+
+
+VDF_TOKEN = re.compile(r'"((?:\\.|[^"\\])*)"|([{}])')
+FULLY_INSTALLED = 4  # `StateFlags` bit steam sets once an app is installed and up to date.
+
+
+def parse_vdf(text: str) -> dict:
+    """Parses the first `"key" { ... }` / `"key" "value"` pair of valve KeyValues text.
+
+    Anything after it (e.g. more steamcmd output) is ignored.
+    """
+    tokens = VDF_TOKEN.finditer(text)
+
+    def parse_block() -> dict:
+        block = {}
+        key = None
+        for match in tokens:
+            string, brace = match.groups()
+            if brace == "}":
+                return block
+            if brace == "{":
+                if key is None:
+                    raise ValueError("Unexpected '{' in vdf text.")
+                block[key] = parse_block()
+                key = None
+            elif key is None:
+                key = string
+            else:
+                block[key] = string
+                key = None
+        return block
+
+    for match in tokens:
+        key, brace = match.groups()
+        if brace:
+            raise ValueError("vdf text doesn't start with a key.")
+        value = next(tokens, None)
+        if value is None:
+            break
+        string, brace = value.groups()
+        if brace == "{":
+            return {key: parse_block()}
+        if brace is None:
+            return {key: string}
+        break
+    raise ValueError("No vdf key / value found.")
+
+
+class SteamUpdateChecker:
+    def __init__(
+        self,
+        steamcmd_dir: str,
+        steamcmd_executable: str,
+        app_id: str,
+        install_dir: str,  # Server install, e.g. steamapps/common/PalServer. The app manifest sits two folders up.
+        state_file: str,  # Keeps the latest build cache and last validate time across runs.
+        latest_build_ttl: float = 300,  # Seconds a queried latest build id is trusted for.
+        validate_every_x_hours: float = 168,  # -1 to only validate after detected corruption.
+        shell: bool = False,
+        manifest_path: str = None,  # App manifest, if it isn't two folders up from `install_dir` (e.g. with +force_install_dir).
+        lock: threading.Lock = None,  # Held while steamcmd runs, share it between checkers using the same steamcmd.
+    ) -> None:
+        self.steamcmd_dir = Path(steamcmd_dir)
+        self.steamcmd_executable = steamcmd_executable
+        self.app_id = str(app_id)
+        self.install_dir = Path(install_dir)
+        if manifest_path is None:
+            manifest_path = self.install_dir.parent.parent / f"appmanifest_{self.app_id}.acf"
+        self.manifest_path = Path(manifest_path)
+        self.state_file = Path(state_file)
+        self.latest_build_ttl = latest_build_ttl
+        self.validate_every_x_hours = validate_every_x_hours
+        self.shell = shell
+        self.lock = lock or threading.Lock()
+        self.state = self._load_state()
+
+    def _load_state(self) -> dict:
+        if not self.state_file.exists():
+            return {}
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable steam update state {self.state_file}: {e}")
+            return {}
+
+    def _save_state(self) -> None:
+        temp_path = self.state_file.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(temp_path, self.state_file)
+
+    def read_manifest(self) -> dict:
+        """The `AppState` section of the app manifest, or None if it's missing or unreadable."""
+        try:
+            with open(self.manifest_path, encoding="utf-8", errors="replace") as f:
+                return parse_vdf(f.read()).get("AppState")
+        except (OSError, ValueError) as e:
+            logger.debug(f"Couldn't read app manifest {self.manifest_path}: {e}")
+            return None
+
+    def installed_build_id(self) -> str:
+        manifest = self.read_manifest()
+        return manifest.get("buildid") if manifest else None
+
+    def corruption_reason(self) -> str:
+        """Why the install looks broken, or None if it looks fine."""
+        manifest = self.read_manifest()
+        if manifest is None:
+            return f"app manifest missing or unreadable ({self.manifest_path})"
+        if not manifest.get("buildid"):
+            return "app manifest has no buildid"
+        state_flags = self._state_flags(manifest)
+        if not state_flags & FULLY_INSTALLED:
+            return f"app state flags are {state_flags}, not fully installed"
+        if not self.install_dir.is_dir():
+            return f"install dir missing ({self.install_dir})"
+        return self.state.get("validation_requested")
+
+    @staticmethod
+    def _state_flags(manifest: dict) -> int:
+        try:
+            return int(manifest.get("StateFlags", 0))
+        except ValueError:
+            return 0
+
+    def request_validation(self, reason: str) -> None:
+        """Makes the next update run a full validate, e.g. after the server crashed on launch."""
+        logger.warning(f"Requesting a steamcmd validate: {reason}")
+        self.state["validation_requested"] = reason
+        self._save_state()
+
+    def validation_due(self, within_seconds: float = 0) -> bool:
+        """True if a scheduled validate is due now (or within `within_seconds`)."""
+        if self.validate_every_x_hours < 0:
+            return False
+        last_validated = self.state.get("last_validated_at", 0)
+        return time.time() + within_seconds - last_validated >= self.validate_every_x_hours * 3600
+
+    def latest_build_id(self, refresh: bool = False) -> str:
+        """Latest public build id, from the cache if it's younger than `latest_build_ttl`."""
+        cached = self.state.get("latest_build")
+        if (
+            not refresh
+            and cached
+            and time.time() - cached["checked_at"] < self.latest_build_ttl
+        ):
+            return cached["buildid"]
+
+        build_id = self._query_latest_build_id()
+        if build_id:
+            self.state["latest_build"] = {"buildid": build_id, "checked_at": time.time()}
+            self._save_state()
+        return build_id
+
+    def _query_latest_build_id(self) -> str:
+        try:
+            with self.lock:
+                result = subprocess.run(
+                    [
+                        self.steamcmd_executable,
+                        "+login",
+                        "anonymous",
+                        "+app_info_update",
+                        "1",
+                        "+app_info_print",
+                        self.app_id,
+                        "+quit",
+                    ],
+                    cwd=self.steamcmd_dir,
+                    capture_output=True,
+                    text=True,
+                    errors="replace",
+                    timeout=120,
+                    shell=self.shell,
+                )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"Couldn't query latest build id from steamcmd: {e}")
+            return None
+
+        start = result.stdout.find(f'"{self.app_id}"')
+        if start == -1:
+            logger.warning("steamcmd app_info_print output had no app info.")
+            return None
+        try:
+            app_info = parse_vdf(result.stdout[start:])[self.app_id]
+            return app_info["depots"]["branches"]["public"]["buildid"]
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Couldn't parse latest build id from steamcmd output: {e}")
+            return None
+
+    def plan(self, force_validate: bool = False, repairs_only: bool = False) -> tuple:
+        """Returns (action, reason) with action "skip", "update" or "validate".
+
+        With `repairs_only`, only an install that looks broken (or a requested validate) runs
+        steamcmd. Nothing is asked from steam, e.g. to get a crashed server back up within seconds.
+        """
+        if force_validate:
+            return "validate", "validate requested by caller"
+        corruption = self.corruption_reason()
+        if corruption:
+            return "validate", corruption
+        if repairs_only:
+            return "skip", "install looks fine, updates wait for the next restart"
+        if self.validation_due():
+            return "validate", f"last validate over {self.validate_every_x_hours} hours ago"
+
+        manifest = self.read_manifest()
+        state_flags = self._state_flags(manifest)
+        if state_flags != FULLY_INSTALLED:
+            return "update", f"app state flags are {state_flags}, an update is pending"
+
+        installed = manifest["buildid"]
+        latest = self.latest_build_id()
+        if latest is None:
+            return "update", "latest build unknown"
+        if installed == latest:
+            return "skip", f"build {installed} is current"
+        return "update", f"build {installed} -> {latest}"
+
+    def record_run(self, validated: bool) -> None:
+        """Call after steamcmd ran successfully."""
+        installed = self.installed_build_id()
+        if validated:
+            self.state["last_validated_at"] = time.time()
+            self.state.pop("validation_requested", None)
+        if installed:
+            # Whatever steamcmd just installed is the latest build as far as we know.
+            self.state["latest_build"] = {"buildid": installed, "checked_at": time.time()}
+        self._save_state()
@@ -1,3 +1,10 @@
+import random
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+
 import psutil
 
 
@@ -21,3 +28,69 @@ def kill_process(process_name: str) -> None:
     for p in psutil.process_iter():
         if p.name() == process_name:
             p.kill()
+
+
+# Priority name: (windows priority class, posix nice value). Raising priority on posix needs root.
+PROCESS_PRIORITIES = {
+    "idle": ("IDLE_PRIORITY_CLASS", 19),
+    "below_normal": ("BELOW_NORMAL_PRIORITY_CLASS", 10),
+    "normal": ("NORMAL_PRIORITY_CLASS", 0),
+    "above_normal": ("ABOVE_NORMAL_PRIORITY_CLASS", -5),
+    "high": ("HIGH_PRIORITY_CLASS", -10),
+}
+
+
+def set_process_scheduling(
+    process: psutil.Process, cpu_affinity: list = None, priority: str = None
+) -> None:
+    """Pins `process` to the `cpu_affinity` cores and sets its priority (see `PROCESS_PRIORITIES`).
+
+    Linux applies both per thread, so every thread the process already has is updated. Threads it
+    starts later inherit them from the thread that starts them.
+    """
+    nice = None
+    if priority is not None:
+        priority_class, nice = PROCESS_PRIORITIES[priority]
+        if sys.platform == "win32":
+            nice = getattr(psutil, priority_class)
+
+    targets = [process]
+    if sys.platform.startswith("linux"):
+        targets = [psutil.Process(thread.id) for thread in process.threads()]
+    for target in targets:
+        try:
+            if cpu_affinity is not None:
+                target.cpu_affinity(cpu_affinity)
+            if nice is not None:
+                target.nice(nice)
+        except psutil.NoSuchProcess:
+            continue  # Thread exited meanwhile.
+
+
+def backoff_delays(initial: float = 0.1, maximum: float = 5.0, factor: float = 2.0):
+    """Yields exponentially growing sleep times with jitter, capped at `maximum`."""
+    delay = initial
+    while True:
+        # Jitter keeps several watchers / probes from retrying in lockstep.
+        yield delay * random.uniform(0.5, 1.0)
+        delay = min(delay * factor, maximum)
+
+
+class PhaseTimer:
+    """Records how long named phases take. Phases may run on different threads."""
+
+    def __init__(self) -> None:
+        self.durations: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.durations[name] = time.perf_counter() - start_time
+
+    def summary(self) -> str:
+        return ", ".join(f"{name}: {seconds:.1f}s" for name, seconds in self.durations.items())